@@ -14,6 +14,8 @@
         1. Direct Shipping from multiple selected warehouses.
         2. Internal Transfers from multiple selected warehouses to a central
            distribution warehouse before final shipment.
+        3. Preview of the split of the cart into shipments, reused when the
+           order is confirmed.
         Configuration available at Website level.
     """,
     'author': 'Generated based on user requirements',
@@ -22,6 +24,7 @@
         'stock',
         'website_sale',
         'product',
+        'multi_warehouse_sourcing_base',
     ],
     'data': [
         'security/ir.model.access.csv',
@@ -30,6 +33,11 @@
         'views/sale_order_views.xml',
         'views/website_sale_templates.xml',
     ],
+    'assets': {
+        'web.assets_frontend': [
+            'advanced_multi_warehouse_sourcing/static/src/js/multi_warehouse_availability.js',
+        ],
+    },
     'installable': True,
     'application': False,
     'license': 'LGPL-3',
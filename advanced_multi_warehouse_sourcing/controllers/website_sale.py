@@ -1,12 +1,108 @@
 # -*- coding: utf-8 -*-
+from odoo import http
 from odoo.addons.website_sale.controllers.main import WebsiteSale
 from odoo.http import request
+from odoo.tools.lru import LRU
+from werkzeug.exceptions import BadRequest
 import logging
+import time
 
 _logger = logging.getLogger(__name__)
 
+# Per-warehouse availability shown on product pages is cached for a short time
+# so that a busy product page does not query stock.quant on every visit.
+AVAILABILITY_CACHE_TTL = 30  # seconds
+_availability_cache = LRU(4096)  # {(dbname, website_id, product_id): (timestamp, {warehouse_id: qty})}
+# The route is public: bound the products of one call, a shop page shows far fewer
+AVAILABILITY_MAX_PRODUCTS = 100
+
 class WebsiteSaleMultiWarehouse(WebsiteSale):
 
+    @http.route('/shop/multi_warehouse/availability', type='json', auth='public', website=True)
+    def multi_warehouse_availability(self, product_ids, **kwargs):
+        """
+        Available quantity of product variants in each of their allowed source warehouses.
+
+        :param product_ids: list of product.product ids, at most AVAILABILITY_MAX_PRODUCTS
+        :return: dict {product_id: {warehouse_id: available_qty}}
+        """
+        if not isinstance(product_ids, list) or len(product_ids) > AVAILABILITY_MAX_PRODUCTS:
+            raise BadRequest("product_ids must be a list of at most %s ids" % AVAILABILITY_MAX_PRODUCTS)
+        website = request.website
+        if not website.multi_warehouse_fulfillment_enabled:
+            return {}
+
+        now = time.time()
+        result = {}
+        missing_ids = []
+        for product_id in {int(product_id) for product_id in product_ids}:
+            cached = _availability_cache.get((request.db, website.id, product_id))
+            if cached and now - cached[0] < AVAILABILITY_CACHE_TTL:
+                result[product_id] = cached[1]
+            else:
+                missing_ids.append(product_id)
+
+        products = request.env['product.product'].browse(missing_ids).exists().filtered(
+            lambda p: p._is_add_to_cart_allowed())
+        products = products.sudo()
+        if products:
+            # One grouped query for all variants and all their source warehouses
+            availability_map = request.env['stock.quant'].sudo()._get_available_quantities_by_warehouse(
+                products, products.source_warehouse_ids)
+            for product in products:
+                product_availability = {
+                    warehouse.id: availability_map.get((product.id, warehouse.id), 0.0)
+                    for warehouse in product.source_warehouse_ids
+                }
+                _availability_cache[(request.db, website.id, product.id)] = (now, product_availability)
+                result[product.id] = product_availability
+        return result
+
+    @http.route('/shop/multi_warehouse/split_preview', type='json', auth='public', website=True)
+    def multi_warehouse_split_preview(self, selections=None, **kwargs):
+        """
+        How the current cart will be split into shipments.
+
+        The plan is kept on the cart, so that confirming the order reuses it as
+        long as the cart and the stock it was computed on did not change.
+
+        :param selections: optional dict {line_id: [warehouse ids]} of source warehouses
+               to select on the cart lines first; warehouses not allowed for the product
+               of their line are ignored
+        :return: dict {'rejected': {line_id: [warehouse ids ignored]}, 'plan': dict as
+                 returned by sale.order._preview_multi_warehouse_sourcing}, empty when
+                 there is no cart or the feature is disabled
+        """
+        website = request.website
+        order = website.sale_get_order()
+        if not website.multi_warehouse_fulfillment_enabled or not order:
+            return {}
+        order = order.sudo()
+
+        rejected = {}
+        if selections:
+            try:
+                selections = {
+                    int(line_id): [int(warehouse_id) for warehouse_id in warehouse_ids]
+                    for line_id, warehouse_ids in selections.items()
+                }
+            except (TypeError, ValueError):
+                _logger.warning("Invalid source warehouse selections: %s", selections)
+                selections = {}
+            lines = order.order_line.filtered(lambda l: l.id in selections)
+            allowed, rejected_by_line = lines._split_source_warehouse_selections({
+                line: selections[line.id] for line in lines
+            })
+            for line, warehouse_ids in allowed.items():
+                if set(warehouse_ids) != set(line.source_warehouse_ids.ids):
+                    line.source_warehouse_ids = [(6, 0, warehouse_ids)]
+            rejected = {line.id: warehouse_ids for line, warehouse_ids in rejected_by_line.items()}
+
+        return {
+            'rejected': rejected,
+            'plan': order._preview_multi_warehouse_sourcing(),
+        }
+
     def _prepare_order_line_values(self, product_id, quantity, **kwargs):
         """
         Override to capture selected source warehouses from website form
@@ -24,11 +120,15 @@ class WebsiteSaleMultiWarehouse(WebsiteSale):
                 try:
                     # Convert string IDs to integers
                     source_warehouse_ids = [int(wh_id) for wh_id in source_warehouse_ids_str]
+                    # Only keep the warehouses allowed for the product
+                    allowed_ids = set(request.env['product.product'].sudo().browse(
+                        int(product_id)).source_warehouse_ids.ids)
+                    source_warehouse_ids = [wh_id for wh_id in source_warehouse_ids if wh_id in allowed_ids]
                     # Use Odoo's command format for Many2many fields
                     values['source_warehouse_ids'] = [(6, 0, source_warehouse_ids)]
-                    _logger.info(f"Adding source warehouses {source_warehouse_ids} to line values for product {product_id}")
+                    _logger.debug("Adding source warehouses %s to line values for product %s", source_warehouse_ids, product_id)
                 except ValueError as e:
-                    _logger.error(f"Could not convert source warehouse IDs: {source_warehouse_ids_str}. Error: {e}")
+                    _logger.error("Could not convert source warehouse IDs: %s. Error: %s", source_warehouse_ids_str, e)
                     # Optionally handle the error, e.g., ignore, show message
 
         return values
\ No newline at end of file
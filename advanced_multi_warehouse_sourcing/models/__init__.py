@@ -2,4 +2,6 @@
 from . import website
 from . import product_template
 from . import sale_order
-from . import sale_order_line
\ No newline at end of file
+from . import sale_order_line
+from . import stock_quant
+from . import multi_warehouse_sourcing
\ No newline at end of file
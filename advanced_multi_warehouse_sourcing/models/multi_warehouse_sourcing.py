@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from odoo import _, api, models
+from odoo.exceptions import UserError
+
+
+class MultiWarehouseSourcing(models.AbstractModel):
+    _inherit = 'multi.warehouse.sourcing'
+
+    @api.model
+    def _apply_direct(self, quantities, configs, plans):
+        """
+        Scenario A: one delivery move per line and source warehouse, shipped
+        directly to the customer. The moves of all lines are created in one batch.
+
+        :return: the created moves
+        """
+        SaleOrderLine = self.env['sale.order.line']
+        moves_vals_list = []
+        for line, qty in quantities.items():
+            moves_vals_list += SaleOrderLine._prepare_direct_delivery_move_vals(
+                line, qty, sourcing_plan=plans[line.order_id.id])
+        return SaleOrderLine._create_multi_warehouse_moves(moves_vals_list, _("direct delivery"))
+
+    @api.model
+    def _apply_collect(self, quantities, configs, plans):
+        """
+        Scenario B: internal transfers from the source warehouses to the
+        collection warehouse; the standard rule then creates the delivery from
+        there, waiting for them. The moves of all lines are created in one batch.
+
+        :return: the created moves
+        """
+        SaleOrderLine = self.env['sale.order.line']
+        moves_vals_list = []
+        for line, qty in quantities.items():
+            collect_wh = self.env['stock.warehouse'].browse(configs[line]['destination_warehouse_id'])
+            if not collect_wh:
+                raise UserError(_("Website '%s' is configured for multi-warehouse collection, but no Distribution Center Warehouse is set.", line.order_id.website_id.name))
+            moves_vals_list += SaleOrderLine._prepare_internal_transfer_move_vals(
+                line, qty, collect_wh, sourcing_plan=plans[line.order_id.id])
+        return SaleOrderLine._create_multi_warehouse_moves(moves_vals_list, _("internal transfer"))
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+
+class StockQuant(models.Model):
+    _inherit = 'stock.quant'
+
+    @api.model
+    def _get_available_quantities_by_warehouse(self, products, warehouses):
+        """
+        Bulk counterpart of _get_available_quantity (non-strict mode) for many
+        products across many warehouses.
+
+        Quants are matched when their location is a child_of the warehouse
+        lot_stock_id. Reserved quantities are deducted and, as in the standard
+        method, negative availability is clamped per lot (untracked quants
+        form their own bucket). The totals are read from the materialized
+        multi.warehouse.stock.summary, one indexed lookup for all pairs.
+
+        :param products: product.product recordset
+        :param warehouses: stock.warehouse recordset
+        :return: dict {(product_id, warehouse_id): float available_qty}.
+                 Every requested pair is present, missing stock maps to 0.0.
+        """
+        return self.env['multi.warehouse.stock.summary'].sudo()._get_available_quantities(products, warehouses)
\ No newline at end of file
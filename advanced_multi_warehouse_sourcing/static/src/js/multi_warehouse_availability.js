@@ -0,0 +1,61 @@
+/** @odoo-module **/
+
+import publicWidget from "@web/legacy/js/public/public_widget";
+import { jsonrpc } from "@web/core/network/rpc_service";
+import { _t } from "@web/core/l10n/translation";
+
+/**
+ * Loads the per-warehouse availability of the product variants after the
+ * product page is rendered, and shows the one of the selected variant.
+ */
+publicWidget.registry.MultiWarehouseAvailability = publicWidget.Widget.extend({
+    selector: ".js_multi_wh_section",
+
+    /**
+     * @override
+     */
+    async start() {
+        await this._super(...arguments);
+        const productIds = (this.el.dataset.productIds || "").split(",").filter(Boolean).map(Number);
+        if (!productIds.length) {
+            return;
+        }
+        this.availability = await jsonrpc("/shop/multi_warehouse/availability", {
+            product_ids: productIds,
+        });
+        this.form = this.el.closest("form");
+        this._onFormChange = () => setTimeout(() => this._render());
+        if (this.form) {
+            this.form.addEventListener("change", this._onFormChange);
+        }
+        this._render();
+    },
+    /**
+     * @override
+     */
+    destroy() {
+        if (this.form) {
+            this.form.removeEventListener("change", this._onFormChange);
+        }
+        this._super(...arguments);
+    },
+
+    //--------------------------------------------------------------------------
+    // Private
+    //--------------------------------------------------------------------------
+
+    _render() {
+        const productInput = this.form && this.form.querySelector("input.product_id");
+        const productId = productInput && productInput.value;
+        const quantities = (this.availability && this.availability[productId]) || {};
+        for (const span of this.el.querySelectorAll(".o_wsale_source_wh_qty")) {
+            const qty = quantities[span.dataset.warehouseId];
+            span.classList.toggle("d-none", qty === undefined);
+            if (qty !== undefined) {
+                span.textContent = _t("(Available: %s)", qty);
+            }
+        }
+    },
+});
+
+export default publicWidget.registry.MultiWarehouseAvailability;
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import TransactionCase
+
+
+class MultiWarehouseSourcingCommon(TransactionCase):
+    """
+    Two source warehouses with known stock, a distribution center and a
+    multi-warehouse website, to check the sourcing of small orders.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env.company
+        cls.partner = cls.env['res.partner'].create({'name': 'Multi-Warehouse Customer'})
+        Warehouse = cls.env['stock.warehouse']
+        cls.warehouse_1 = Warehouse.create({'name': 'Source 1', 'code': 'MWS1', 'company_id': cls.company.id})
+        cls.warehouse_2 = Warehouse.create({'name': 'Source 2', 'code': 'MWS2', 'company_id': cls.company.id})
+        cls.distribution_center = Warehouse.create({
+            'name': 'Distribution Center', 'code': 'MWDC', 'company_id': cls.company.id,
+        })
+        cls.sources = cls.warehouse_1 | cls.warehouse_2
+        cls.product = cls.env['product.product'].create({
+            'name': 'Multi-Warehouse Product',
+            'type': 'product',
+            'source_warehouse_ids': [(6, 0, cls.sources.ids)],
+        })
+        cls.website = cls.env['website'].create({
+            'name': 'Multi-Warehouse Website',
+            'company_id': cls.company.id,
+            'multi_warehouse_fulfillment_enabled': True,
+            'multi_warehouse_fulfillment_warehouse_id': cls.distribution_center.id,
+        })
+
+    @classmethod
+    def _set_stock(cls, warehouse, qty, product=None):
+        cls.env['stock.quant']._update_available_quantity(product or cls.product, warehouse.lot_stock_id, qty)
+
+    def _create_order(self, qty, direct=True, product=None):
+        return self.env['sale.order'].create({
+            'partner_id': self.partner.id,
+            'website_id': self.website.id,
+            'multi_warehouse_delivery_enabled': direct,
+            'order_line': [(0, 0, {
+                'product_id': (product or self.product).id,
+                'product_uom_qty': qty,
+                'source_warehouse_ids': [(6, 0, self.sources.ids)],
+            })],
+        })
+
+    def _get_source_moves(self, line):
+        return self.env['multi.warehouse.sourcing']._get_source_moves(line)
+
+    def _sourced_by_warehouse(self, line):
+        """ :return: dict {warehouse: qty} of the open source moves of the line """
+        result = {}
+        for move in self._get_source_moves(line):
+            warehouse = move.location_id.warehouse_id
+            result[warehouse] = result.get(warehouse, 0.0) + move.product_uom_qty
+        return result
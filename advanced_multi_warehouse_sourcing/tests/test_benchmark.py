@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+from odoo.addons.multi_warehouse_sourcing_base.tests.common import MultiWarehouseBenchmarkCommon
+
+
+@tagged('post_install', '-at_install', 'benchmark')
+class TestMultiWarehouseSourcingBenchmark(MultiWarehouseBenchmarkCommon):
+    """
+    Website checkout confirmation with lines sourced from several warehouses.
+
+    Run with ``--test-tags benchmark``; the timings and query counts are logged.
+    """
+
+    # Query budgets: (per confirmed order, per line added to every order), measured
+    # on the default data set plus budget_margin. None until a run was measured:
+    # the check is skipped and the skip message gives the budget to set here.
+    scenario_a_query_budget = None
+    scenario_b_query_budget = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.website = cls.env['website'].create({
+            'name': 'Benchmark Website',
+            'company_id': cls.company.id,
+            'multi_warehouse_fulfillment_enabled': True,
+            'multi_warehouse_fulfillment_warehouse_id': cls.distribution_center.id,
+        })
+        cls.source_line_vals = {'source_warehouse_ids': [(6, 0, cls.warehouses.ids)]}
+
+    def test_benchmark_scenario_a_direct_delivery(self):
+        def create_orders(n_orders, n_lines):
+            return self._create_orders(
+                self.website, n_orders, n_lines,
+                order_vals={'multi_warehouse_delivery_enabled': True},
+                line_vals=self.source_line_vals,
+            )
+
+        report, _double_report = self._assert_query_budget(
+            'Scenario A (direct delivery)', create_orders,
+            self._get_query_budget('SCENARIO_A', self.scenario_a_query_budget))
+        self.assertTrue(report['created']['stock.move'])
+
+    def test_benchmark_scenario_b_collect_at_dc(self):
+        def create_orders(n_orders, n_lines):
+            return self._create_orders(
+                self.website, n_orders, n_lines,
+                order_vals={
+                    'multi_warehouse_delivery_enabled': False,
+                    'warehouse_id': self.distribution_center.id,
+                },
+                line_vals=self.source_line_vals,
+            )
+
+        report, _double_report = self._assert_query_budget(
+            'Scenario B (collect at DC)', create_orders,
+            self._get_query_budget('SCENARIO_B', self.scenario_b_query_budget))
+        self.assertTrue(report['created']['stock.move'])
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import MultiWarehouseSourcingCommon
+
+
+@tagged('post_install', '-at_install')
+class TestSourcingJob(MultiWarehouseSourcingCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['ir.config_parameter'].sudo().set_param('multi_warehouse_sourcing_base.async_sourcing', True)
+        cls._set_stock(cls.warehouse_1, 10)
+        cls.Job = cls.env['multi.warehouse.sourcing.job']
+
+    def _process_jobs(self):
+        self.Job._cron_process_jobs()
+
+    def test_confirmation_is_sourced_by_a_job(self):
+        order = self._create_order(4)
+        order.action_confirm()
+        self.assertEqual(order.multi_warehouse_sourcing_state, 'queued')
+        self.assertFalse(self._get_source_moves(order.order_line))
+
+        self._process_jobs()
+        self.assertEqual(order.multi_warehouse_sourcing_state, 'done')
+        self.assertEqual(self._sourced_by_warehouse(order.order_line), {self.warehouse_1: 4})
+
+    def test_same_launch_is_enqueued_once(self):
+        order = self._create_order(4)
+        order.action_confirm()
+        order._enqueue_multi_warehouse_sourcing(order.order_line)
+        self.assertEqual(len(order.multi_warehouse_sourcing_job_ids), 1)
+
+    def test_quantity_increase_after_confirmation(self):
+        order = self._create_order(4)
+        order.action_confirm()
+        self._process_jobs()
+        line = order.order_line
+
+        line.product_uom_qty = 7
+        jobs = order.multi_warehouse_sourcing_job_ids
+        self.assertEqual(len(jobs), 2, "the increase must get its own job")
+        self.assertEqual(jobs.sorted('id')[-1].state, 'pending')
+
+        self._process_jobs()
+        self.assertEqual(set(jobs.mapped('state')), {'done'})
+        self.assertEqual(sum(self._sourced_by_warehouse(line).values()), 7)
+
+    def test_back_to_a_previous_quantity_is_queued_again(self):
+        order = self._create_order(4)
+        order.action_confirm()
+        self._process_jobs()
+        line = order.order_line
+
+        line.product_uom_qty = 2
+        self._process_jobs()
+        line.product_uom_qty = 4
+        self.assertIn('pending', order.multi_warehouse_sourcing_job_ids.mapped('state'))
+        self._process_jobs()
+        self.assertEqual(sum(self._sourced_by_warehouse(line).values()), 4)
+
+    def test_parallel_confirmation(self):
+        other_product = self.env['product.product'].create({
+            'name': 'Other Multi-Warehouse Product',
+            'type': 'product',
+            'source_warehouse_ids': [(6, 0, self.sources.ids)],
+        })
+        orders = self._create_order(1) | self._create_order(1, product=other_product) | self._create_order(2)
+        batch = self.env['sale.order'].confirm_orders_in_parallel(orders.ids, workers=2)
+        jobs = self.Job.browse(batch['jobs'])
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(set(jobs.mapped('job_type')), {'confirmation'})
+        # orders sharing a product are confirmed by the same job
+        self.assertEqual(sorted(len(job.order_ids) for job in jobs), [1, 2])
+        self.assertEqual(self.env['sale.order'].get_parallel_confirmation_report(batch['batch'])['state'], 'running')
+
+        # each confirmation cron takes one partition
+        self.Job._cron_process_jobs(batch_size=1, job_type='confirmation')
+        self.assertEqual(sorted(jobs.mapped('state')), ['done', 'pending'])
+        self.Job._cron_process_jobs(batch_size=1, job_type='confirmation')
+
+        report = self.env['sale.order'].get_parallel_confirmation_report(batch['batch'])
+        self.assertEqual(report['state'], 'done')
+        self.assertEqual(sorted(report['confirmed']), sorted(orders.ids))
+        self.assertFalse(report['failed'])
+        self.assertEqual(set(orders.mapped('state')), {'sale'})
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from odoo.addons.multi_warehouse_sourcing_base.tools.strategies import AvailabilityStrategy
+
+from .common import MultiWarehouseSourcingCommon
+
+
+@tagged('post_install', '-at_install')
+class TestSourcingService(MultiWarehouseSourcingCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Shortfall = cls.env['multi.warehouse.shortfall']
+
+    def _get_shortfall(self, line):
+        return self.Shortfall.search([('sale_line_id', '=', line.id), ('state', '=', 'open')])
+
+    def test_direct_delivery_split(self):
+        self._set_stock(self.warehouse_1, 4)
+        self._set_stock(self.warehouse_2, 3)
+        order = self._create_order(6)
+        order.action_confirm()
+        self.assertEqual(self._sourced_by_warehouse(order.order_line), {self.warehouse_1: 4, self.warehouse_2: 2})
+        moves = self._get_source_moves(order.order_line)
+        self.assertEqual(set(moves.mapped('state')), {'assigned'})
+        self.assertEqual(moves.location_dest_id, order.partner_shipping_id.property_stock_customer)
+        self.assertFalse(self._get_shortfall(order.order_line))
+
+    def test_collect_at_distribution_center(self):
+        self._set_stock(self.warehouse_1, 4)
+        order = self._create_order(4, direct=False)
+        order.action_confirm()
+        line = order.order_line
+        move = self._get_source_moves(line)
+        self.assertEqual(move.location_id, self.warehouse_1.lot_stock_id)
+        self.assertEqual(move.location_dest_id, self.distribution_center.lot_stock_id)
+        # the delivery to the customer follows the standard rules of the distribution center
+        delivery = line.move_ids - move
+        self.assertEqual(delivery.location_id, self.distribution_center.lot_stock_id)
+        self.assertEqual(delivery.product_uom_qty, 4)
+
+    def test_quantity_decrease_reduces_latest_moves(self):
+        self._set_stock(self.warehouse_1, 4)
+        self._set_stock(self.warehouse_2, 3)
+        order = self._create_order(6)
+        order.action_confirm()
+        line = order.order_line
+        move_1 = self._get_source_moves(line).filtered(lambda m: m.location_id == self.warehouse_1.lot_stock_id)
+
+        line.product_uom_qty = 3
+        self.assertEqual(self._sourced_by_warehouse(line), {self.warehouse_1: 3})
+        self.assertEqual(move_1.product_uom_qty, 3)
+        self.assertEqual(move_1.quantity, 3, "the shrunk move is reserved again")
+
+        # an increase only sources the missing quantity
+        line.product_uom_qty = 5
+        self.assertEqual(move_1.product_uom_qty, 3)
+        self.assertNotEqual(move_1.state, 'cancel')
+        self.assertEqual(sum(self._sourced_by_warehouse(line).values()), 5)
+        self.assertFalse(self._get_shortfall(line))
+
+    def test_shortfall_is_sourced_when_stock_appears(self):
+        self._set_stock(self.warehouse_1, 2)
+        order = self._create_order(6)
+        order.action_confirm()
+        line = order.order_line
+        self.assertEqual(self._get_shortfall(line).quantity, 4)
+
+        self._set_stock(self.warehouse_2, 5)
+        self.Shortfall._flush_dirty_products(self.env.cr, set(self.product.ids))
+        self.Shortfall._process_dirty_products()
+        self.assertFalse(self._get_shortfall(line))
+        self.assertEqual(self._sourced_by_warehouse(line), {self.warehouse_1: 2, self.warehouse_2: 4})
+
+    def test_shortfall_of_cancelled_order(self):
+        order = self._create_order(6)
+        order.action_confirm()
+        shortfall = self._get_shortfall(order.order_line)
+        self.assertEqual(shortfall.quantity, 6)
+        order._action_cancel()
+        shortfall._source()
+        self.assertEqual(shortfall.state, 'cancel')
+
+    def test_simulation_shares_availability_and_writes_nothing(self):
+        self._set_stock(self.warehouse_1, 5)
+        order_1 = self._create_order(4)
+        order_2 = self._create_order(4)
+        result = self.env['sale.order'].simulate_multi_warehouse_sourcing([order_1.id, order_2.id])
+        self.assertEqual([order['order_id'] for order in result], [order_1.id, order_2.id])
+        line_1, line_2 = result[0]['lines'][0], result[1]['lines'][0]
+        self.assertEqual(line_1['allocations'], [{
+            'warehouse_id': self.warehouse_1.id, 'warehouse_name': self.warehouse_1.name, 'quantity': 4,
+        }])
+        self.assertEqual((line_1['shortfall'], line_2['shortfall']), (0, 3))
+        self.assertEqual(line_2['allocations'][0]['quantity'], 1)
+
+        lines = order_1.order_line | order_2.order_line
+        self.assertFalse(self._get_source_moves(lines))
+        self.assertFalse(self.env['multi.warehouse.allocation'].search([('sale_line_id', 'in', lines.ids)]))
+        self.assertFalse(order_1.multi_warehouse_plan)
+
+    def test_preview_plan_is_reused(self):
+        self._set_stock(self.warehouse_1, 5)
+        order = self._create_order(4)
+        preview = order._preview_multi_warehouse_sourcing()
+        self.assertEqual(preview['warehouse_ids'], self.warehouse_1.ids)
+        self.assertTrue(order.multi_warehouse_plan)
+
+        with patch.object(AvailabilityStrategy, 'plan', autospec=True, side_effect=AvailabilityStrategy.plan) as plan:
+            order.action_confirm()
+        plan.assert_not_called()
+        self.assertEqual(self._sourced_by_warehouse(order.order_line), {self.warehouse_1: 4})
+
+    def test_preview_is_planned_again_after_stock_change(self):
+        self._set_stock(self.warehouse_1, 3)
+        self._set_stock(self.warehouse_2, 1)
+        order = self._create_order(4)
+        order._preview_multi_warehouse_sourcing()
+
+        self._set_stock(self.warehouse_2, 3)
+        with patch.object(AvailabilityStrategy, 'plan', autospec=True, side_effect=AvailabilityStrategy.plan) as plan:
+            order.action_confirm()
+        plan.assert_called_once()
+        self.assertEqual(self._sourced_by_warehouse(order.order_line), {self.warehouse_2: 4})
+
+    def test_decisions_are_logged(self):
+        self._set_stock(self.warehouse_1, 4)
+        order = self._create_order(6)
+        order.action_confirm()
+        Log = self.env['multi.warehouse.sourcing.log']
+        Log._flush_buffer()
+        log = Log.search([('sale_line_id', '=', order.order_line.id)])
+        self.assertEqual(log.warehouse_id, self.warehouse_1)
+        self.assertEqual((log.quantity, log.available_quantity, log.shortfall), (4, 4, 2))
+        self.assertEqual(log.strategy, 'availability')
+
+        self.env['ir.config_parameter'].sudo().set_param('multi_warehouse_sourcing_base.decision_log', False)
+        other_order = self._create_order(2)
+        other_order.action_confirm()
+        Log._flush_buffer()
+        self.assertFalse(Log.search([('order_id', '=', other_order.id)]))
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+{
+    'name': 'Multi-Warehouse Sourcing Base',
+    'version': '17.0.1.0.0',
+    'category': 'Inventory/Inventory',
+    'summary': """
+        Shared technical layer for the multi-warehouse sourcing modules.
+    """,
+    'description': """
+        Common services used by the multi-warehouse fulfillment modules:
+        - Cached warehouse topology (picking types, stock and transit
+          locations) resolved once per warehouse or warehouse pair.
+        - Order-level allocation engine minimizing the number of source
+          warehouses (shipments) of an order.
+        - Optional background sourcing: confirmation only queues a job,
+          processed by a scheduled action with retries.
+        - Allocation ledger of planned but not yet reserved stock, protected
+          by per-product locks, so parallel confirmations do not allocate the
+          same units twice.
+        - Per-phase timings and SQL query counts of the sourcing, as
+          structured log events and aggregated statistics.
+        - Bulk confirmation API (sale.order.confirm_orders_in_batch) confirming
+          imported orders by chunks with per-order failure isolation.
+        - Shortfall queue: quantities that could not be sourced are sourced
+          again by the scheduler once stock of the product changes.
+        - Materialized per-warehouse availability (on hand, reserved and
+          available quantities), refreshed incrementally from quant changes.
+        - Single-pass sourcing service (multi.warehouse.sourcing): the modules
+          contribute the configuration of each line and the creation of the
+          moves, the service plans and applies each order once.
+        - Side-effect free simulation of the sourcing of many orders
+          (sale.order.simulate_multi_warehouse_sourcing).
+        - Parallel confirmation of order backlogs, partitioned by product so
+          workers do not contend on the same stock, each partition confirmed
+          by a background job in its own cron worker
+          (sale.order.confirm_orders_in_parallel).
+        - Daily picking capacity per warehouse: open outbound work is tracked
+          in insert-only counters and saturated warehouses are used last or skipped.
+        - Sourcing plans computed ahead of confirmation are kept on the order
+          and reused while the order and the stock are unchanged.
+        - Append-only log of the sourcing decisions (warehouse, quantity,
+          availability seen, shortfall), pruned by date and exported as CSV
+          or JSON Lines from /multi_warehouse_sourcing/decisions/export.
+    """,
+    'depends': [
+        'sale_stock',
+    ],
+    'data': [
+        'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
+        'views/multi_warehouse_sourcing_job_views.xml',
+        'views/multi_warehouse_sourcing_stat_views.xml',
+        'views/multi_warehouse_shortfall_views.xml',
+        'views/multi_warehouse_stock_summary_views.xml',
+        'views/multi_warehouse_capacity_counter_views.xml',
+        'views/stock_warehouse_views.xml',
+        'views/multi_warehouse_sourcing_log_views.xml',
+        'views/sale_order_views.xml',
+        'views/res_config_settings_views.xml',
+    ],
+    'installable': True,
+    'application': False,
+    'license': 'LGPL-3',
+}
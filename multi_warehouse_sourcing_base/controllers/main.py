@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from werkzeug.exceptions import BadRequest
+
+from odoo import _, api, fields, http
+from odoo.exceptions import AccessError
+from odoo.http import request
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class MultiWarehouseSourcingLogExport(http.Controller):
+
+    @http.route('/multi_warehouse_sourcing/decisions/export', type='http', auth='user', methods=['GET'])
+    def export_decisions(self, date_from=None, date_to=None, file_format='csv', **kwargs):
+        """
+        Stream the sourcing decisions of a date range as CSV or JSON Lines.
+
+        :param date_from: start of the range (included), defaults to 30 days ago
+        :param date_to: end of the range (excluded), defaults to now
+        :param file_format: 'csv' or 'jsonl'
+        """
+        if file_format not in EXPORT_CONTENT_TYPES:
+            return request.not_found()
+        if not request.env.user.has_group('stock.group_stock_manager'):
+            raise AccessError(_("Only inventory administrators can export the sourcing decisions."))
+        now = fields.Datetime.now()
+        try:
+            date_from = fields.Datetime.to_datetime(date_from) or now - timedelta(days=30)
+            date_to = fields.Datetime.to_datetime(date_to) or now
+        except ValueError:
+            raise BadRequest(_("Invalid date range."))
+
+        # The response is sent after the request cursor is closed: read from a cursor of its own
+        registry = request.env.registry
+        uid = request.env.uid
+        context = dict(request.env.context)
+
+        def generate():
+            with registry.cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                for chunk in env['multi.warehouse.sourcing.log'].sudo()._iter_export(
+                        date_from, date_to, file_format=file_format):
+                    yield chunk.encode()
+
+        filename = 'sourcing_decisions_%s_%s.%s' % (
+            date_from.strftime('%Y%m%d'), date_to.strftime('%Y%m%d'), file_format)
+        return request.make_response(generate(), headers=[
+            ('Content-Type', EXPORT_CONTENT_TYPES[file_format]),
+            ('Content-Disposition', 'attachment; filename="%s"' % filename),
+        ])
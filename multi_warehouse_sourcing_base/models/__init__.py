@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from . import stock_warehouse
+from . import stock_picking_type
+from . import stock_location
+from . import multi_warehouse_sourcing_job
+from . import sale_order
+from . import res_config_settings
+from . import multi_warehouse_allocation
+from . import stock_move
+from . import multi_warehouse_sourcing_stat
+from . import multi_warehouse_shortfall
+from . import stock_quant
+from . import procurement_group
+from . import sale_order_line
+from . import multi_warehouse_stock_summary
+from . import multi_warehouse_sourcing
+from . import multi_warehouse_capacity_counter
+from . import multi_warehouse_sourcing_log
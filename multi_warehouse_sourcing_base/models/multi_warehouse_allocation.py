@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import api, fields, models
+from odoo.tools import float_compare, float_is_zero
+
+
+class MultiWarehouseAllocation(models.Model):
+    """
+    Ledger of the stock promised by sourcing plans that is not reserved yet.
+
+    Planners lock the products they source (transaction-level advisory locks,
+    always taken in product id order so concurrent planners cannot deadlock),
+    deduct the open allocations from the quant availability, and record their
+    own allocations before releasing the locks at commit. A plan therefore
+    sees what in-flight plans already took, without any global lock.
+    Allocations are released once the corresponding moves are reserved, done
+    or cancelled, and ignored after their expiration date.
+    """
+    _name = 'multi.warehouse.allocation'
+    _description = 'Multi-Warehouse Allocation'
+    _order = 'id'
+
+    product_id = fields.Many2one('product.product', string="Product", required=True, ondelete='cascade')
+    warehouse_id = fields.Many2one('stock.warehouse', string="Warehouse", required=True, ondelete='cascade')
+    sale_line_id = fields.Many2one('sale.order.line', string="Sales Order Line", index=True, ondelete='cascade')
+    quantity = fields.Float(string="Quantity", digits='Product Unit of Measure', required=True)
+    state = fields.Selection([
+        ('open', 'Open'),
+        ('released', 'Released'),
+    ], string="Status", default='open', required=True)
+    expiration_date = fields.Datetime(string="Expiration Date", required=True)
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS multi_warehouse_allocation_open_idx
+                ON multi_warehouse_allocation (product_id, warehouse_id)
+             WHERE state = 'open'
+        """)
+
+    @api.model
+    def _lock_products(self, product_ids):
+        """ Take the per-product advisory locks, in a deterministic (id) order. """
+        product_ids = sorted(set(product_ids))
+        if not product_ids:
+            return
+        # The ORDER BY in the subquery makes the locks be acquired in id order
+        self.env.cr.execute("""
+            SELECT pg_advisory_xact_lock(hashtext('multi.warehouse.allocation'), product.id)
+              FROM (SELECT unnest(%s) AS id ORDER BY 1) product
+        """, [product_ids])
+
+    @api.model
+    def _get_open_quantities(self, product_ids, warehouse_ids):
+        """ :return: dict {(product_id, warehouse_id): qty allocated but not reserved yet} """
+        if not product_ids or not warehouse_ids:
+            return {}
+        groups = self.sudo()._read_group(
+            [
+                ('product_id', 'in', list(product_ids)),
+                ('warehouse_id', 'in', list(warehouse_ids)),
+                ('state', '=', 'open'),
+                ('expiration_date', '>', fields.Datetime.now()),
+            ],
+            groupby=['product_id', 'warehouse_id'],
+            aggregates=['quantity:sum'],
+        )
+        return {(product.id, warehouse.id): quantity for product, warehouse, quantity in groups}
+
+    @api.model
+    def _lock_and_deduct(self, availability_map):
+        """
+        Lock the products of an availability map and deduct the open allocations from it.
+
+        :param availability_map: dict {(product_id, warehouse_id): available qty}, updated in place
+        :return: availability_map
+        """
+        self._lock_products({product_id for product_id, _warehouse_id in availability_map})
+        return self._deduct_open_quantities(availability_map)
+
+    @api.model
+    def _deduct_open_quantities(self, availability_map):
+        """
+        Deduct the open allocations from an availability map, without locking
+        (e.g. for simulations, which do not allocate anything).
+
+        :param availability_map: dict {(product_id, warehouse_id): available qty}, updated in place
+        :return: availability_map
+        """
+        product_ids = {product_id for product_id, _warehouse_id in availability_map}
+        warehouse_ids = {warehouse_id for _product_id, warehouse_id in availability_map}
+        for key, quantity in self._get_open_quantities(product_ids, warehouse_ids).items():
+            if key in availability_map:
+                availability_map[key] -= quantity
+        return availability_map
+
+    @api.model
+    def _allocate(self, allocations):
+        """
+        Record the allocations of a sourcing plan.
+
+        :param allocations: iterable of (sale.order.line, warehouse_id, qty)
+        """
+        lifetime = int(self.env['ir.config_parameter'].sudo().get_param(
+            'multi_warehouse_sourcing_base.allocation_lifetime', 60))
+        expiration_date = fields.Datetime.now() + timedelta(minutes=lifetime)
+        return self.sudo().create([{
+            'product_id': line.product_id.id,
+            'warehouse_id': warehouse_id,
+            'sale_line_id': line.id,
+            'quantity': qty,
+            'expiration_date': expiration_date,
+        } for line, warehouse_id, qty in allocations if qty > 0])
+
+    @api.model
+    def _release_moves(self, moves):
+        """
+        Release what source moves no longer wait for: their reserved, done or
+        cancelled quantities.
+
+        The open quantity of each (line, warehouse) allocation is brought down to
+        what the source moves of the line still have to reserve in the warehouse,
+        so a partially available move keeps its remainder allocated, and calling
+        this again for the same moves releases nothing twice.
+
+        :param moves: multi-warehouse source moves (see stock.move.is_multi_warehouse_source_move)
+        """
+        moves = moves.filtered(lambda m: m.is_multi_warehouse_source_move and m.sale_line_id)
+        if not moves:
+            return
+        allocations = self.sudo().search([
+            ('sale_line_id', 'in', moves.sale_line_id.ids),
+            ('state', '=', 'open'),
+        ])
+        if not allocations:
+            return
+
+        # Quantity the open source moves still have to reserve, per line and warehouse
+        waiting = defaultdict(float)
+        for move in self.env['multi.warehouse.sourcing']._get_source_moves(allocations.sale_line_id):
+            if move.state == 'done':
+                continue
+            line = move.sale_line_id
+            missing = move.product_uom._compute_quantity(
+                move.product_uom_qty - move.quantity, line.product_uom, rounding_method='HALF-UP')
+            waiting[(line.id, move.location_id.warehouse_id.id)] += max(missing, 0.0)
+
+        precision = self.env['decimal.precision'].precision_get('Product Unit of Measure')
+        released = self.browse()
+        for allocation in allocations:
+            key = (allocation.sale_line_id.id, allocation.warehouse_id.id)
+            quantity = min(allocation.quantity, waiting[key])
+            waiting[key] -= quantity
+            if float_is_zero(quantity, precision_digits=precision):
+                released |= allocation
+            elif float_compare(quantity, allocation.quantity, precision_digits=precision) < 0:
+                allocation.quantity = quantity
+        released.write({'state': 'released'})
+
+    @api.autovacuum
+    def _gc_allocations(self):
+        self.sudo().search([
+            '|', ('state', '=', 'released'), ('expiration_date', '<', fields.Datetime.now()),
+        ]).unlink()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_COUNTER_COLUMNS = (
+    'planned_lines', 'planned_quantity',
+    'done_lines', 'done_quantity',
+    'cancelled_lines', 'cancelled_quantity',
+)
+
+
+class MultiWarehouseCapacityCounter(models.Model):
+    """
+    Outbound work planned on each warehouse, per day.
+
+    Rows hold, for a warehouse and the day the work was planned, a number of
+    source move lines and their quantity (product unit of measure) planned,
+    done and cancelled. The table is insert-only for transactions: source
+    moves created, resized, done or cancelled append one row of increments
+    with a single INSERT, so concurrent confirmations never wait on each
+    other for a counter row and the load of a warehouse is known without
+    reading stock.move. The open work of a warehouse (planned, not done or
+    cancelled yet) is the sum of its rows; a cron compacts the rows of each
+    (warehouse, day) into one.
+
+    Moves split from a source move (backorders) are the remainder of a line
+    already counted: they only count their quantity.
+    """
+    _name = 'multi.warehouse.capacity.counter'
+    _description = 'Multi-Warehouse Capacity Counter'
+    _order = 'date desc, warehouse_id'
+    _log_access = False
+
+    warehouse_id = fields.Many2one('stock.warehouse', string="Warehouse", required=True, readonly=True,
+                                   ondelete='cascade')
+    date = fields.Date(string="Planning Date", required=True, readonly=True)
+    planned_lines = fields.Integer(string="Planned Lines", readonly=True)
+    planned_quantity = fields.Float(string="Planned Quantity", digits='Product Unit of Measure', readonly=True)
+    done_lines = fields.Integer(string="Done Lines", readonly=True)
+    done_quantity = fields.Float(string="Done Quantity", digits='Product Unit of Measure', readonly=True)
+    cancelled_lines = fields.Integer(string="Cancelled Lines", readonly=True)
+    cancelled_quantity = fields.Float(string="Cancelled Quantity", digits='Product Unit of Measure', readonly=True)
+    open_lines = fields.Integer(string="Open Lines", compute='_compute_open')
+    open_quantity = fields.Float(string="Open Quantity", digits='Product Unit of Measure', compute='_compute_open')
+
+    def init(self):
+        # Several rows per (warehouse, date) until they are compacted
+        self.env.cr.execute("""
+            DROP INDEX IF EXISTS multi_warehouse_capacity_counter_warehouse_date_uniq;
+            CREATE INDEX IF NOT EXISTS multi_warehouse_capacity_counter_warehouse_date_index
+                ON multi_warehouse_capacity_counter (warehouse_id, date)
+        """)
+        # Start from the source moves still open when the counters are created
+        self.env.cr.execute("""
+            INSERT INTO multi_warehouse_capacity_counter
+                        (warehouse_id, date, planned_lines, planned_quantity, done_lines, done_quantity,
+                         cancelled_lines, cancelled_quantity)
+                 SELECT location.warehouse_id, move.create_date::date,
+                        COUNT(*) FILTER (WHERE move.is_multi_warehouse_split_move IS NOT TRUE),
+                        SUM(move.product_qty), 0, 0, 0, 0
+                   FROM stock_move move
+                   JOIN stock_location location ON location.id = move.location_id
+                  WHERE move.is_multi_warehouse_source_move
+                    AND move.state NOT IN ('done', 'cancel')
+                    AND location.warehouse_id IS NOT NULL
+                    AND NOT EXISTS (SELECT 1 FROM multi_warehouse_capacity_counter)
+               GROUP BY location.warehouse_id, move.create_date::date
+        """)
+
+    @api.depends('planned_lines', 'planned_quantity', 'done_lines', 'done_quantity',
+                 'cancelled_lines', 'cancelled_quantity')
+    def _compute_open(self):
+        for counter in self:
+            counter.open_lines = counter.planned_lines - counter.done_lines - counter.cancelled_lines
+            counter.open_quantity = counter.planned_quantity - counter.done_quantity - counter.cancelled_quantity
+
+    @api.model
+    def _increment(self, increments):
+        """
+        Add to the counters, by appending rows of increments.
+
+        :param increments: dict {(warehouse_id, date): {counter column: value to add}}
+        """
+        rows = [
+            [warehouse_id, date] + [values.get(column, 0) for column in _COUNTER_COLUMNS]
+            for (warehouse_id, date), values in sorted(increments.items())
+            if warehouse_id and any(values.values())
+        ]
+        if not rows:
+            return
+        columns = zip(*rows)
+        self.env.cr.execute("""
+            INSERT INTO multi_warehouse_capacity_counter
+                        (warehouse_id, date, planned_lines, planned_quantity, done_lines, done_quantity,
+                         cancelled_lines, cancelled_quantity)
+                 SELECT * FROM unnest(%s::int[], %s::date[], %s::int[], %s::float8[], %s::int[], %s::float8[],
+                                      %s::int[], %s::float8[])
+        """, [list(column) for column in columns])
+        self.invalidate_model()
+
+    @api.model
+    def _count_moves(self, moves, state, quantities=None):
+        """
+        Count source moves as planned, done or cancelled.
+
+        Each move is counted on its source warehouse, on the day it was planned.
+        Moves split from another source move only count their quantity.
+
+        :param moves: stock.move recordset
+        :param state: 'planned', 'done' or 'cancelled'
+        :param quantities: optional dict {stock.move: qty to count instead of its
+                 product_qty}; the moves are then not counted as lines (resized moves)
+        """
+        increments = defaultdict(lambda: defaultdict(int))
+        for move in moves:
+            key = (move.location_id.warehouse_id.id, (move.create_date or fields.Datetime.now()).date())
+            if quantities is None:
+                if not move.is_multi_warehouse_split_move:
+                    increments[key]['%s_lines' % state] += 1
+                increments[key]['%s_quantity' % state] += move.product_qty
+            else:
+                increments[key]['%s_quantity' % state] += quantities.get(move, 0.0)
+        self._increment(increments)
+
+    @api.model
+    def _get_open_loads(self, warehouse_ids):
+        """
+        :param warehouse_ids: ids of stock.warehouse
+        :return: dict {warehouse_id: (open lines, open quantity)}, warehouses without open
+                 work are omitted
+        """
+        if not warehouse_ids:
+            return {}
+        self.env.cr.execute("""
+            SELECT warehouse_id,
+                   SUM(planned_lines - done_lines - cancelled_lines),
+                   SUM(planned_quantity - done_quantity - cancelled_quantity)
+              FROM multi_warehouse_capacity_counter
+             WHERE warehouse_id = ANY(%s)
+          GROUP BY warehouse_id
+        """, [list(warehouse_ids)])
+        return {
+            warehouse_id: (max(open_lines or 0, 0), max(open_quantity or 0.0, 0.0))
+            for warehouse_id, open_lines, open_quantity in self.env.cr.fetchall()
+        }
+
+    @api.model
+    def _compact(self):
+        """ Replace the rows of each (warehouse, date) having several rows by their sum, in one statement. """
+        self.env.cr.execute("""
+            WITH compacted AS (
+                DELETE FROM multi_warehouse_capacity_counter
+                 WHERE (warehouse_id, date) IN (
+                        SELECT warehouse_id, date
+                          FROM multi_warehouse_capacity_counter
+                      GROUP BY warehouse_id, date
+                        HAVING COUNT(*) > 1)
+             RETURNING warehouse_id, date, planned_lines, planned_quantity, done_lines, done_quantity,
+                       cancelled_lines, cancelled_quantity
+            )
+            INSERT INTO multi_warehouse_capacity_counter
+                        (warehouse_id, date, planned_lines, planned_quantity, done_lines, done_quantity,
+                         cancelled_lines, cancelled_quantity)
+                 SELECT warehouse_id, date, SUM(planned_lines), SUM(planned_quantity), SUM(done_lines),
+                        SUM(done_quantity), SUM(cancelled_lines), SUM(cancelled_quantity)
+                   FROM compacted
+               GROUP BY warehouse_id, date
+        """)
+        self.invalidate_model()
+
+    @api.model
+    def _cron_compact(self):
+        self._compact()
+
+    @api.autovacuum
+    def _gc_counters(self):
+        """ Delete the counters of past days without open work left. """
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'multi_warehouse_sourcing_base.capacity_counter_retention_days', 30))
+        self.env.cr.execute("""
+            DELETE FROM multi_warehouse_capacity_counter
+             WHERE (warehouse_id, date) IN (
+                    SELECT warehouse_id, date
+                      FROM multi_warehouse_capacity_counter
+                     WHERE date < %s
+                  GROUP BY warehouse_id, date
+                    HAVING SUM(planned_lines - done_lines - cancelled_lines) <= 0)
+        """, [fields.Date.today() - timedelta(days=retention_days)])
+        self.invalidate_model()
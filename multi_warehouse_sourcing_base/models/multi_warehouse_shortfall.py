@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+EPSILON = 1e-9
+
+
+class MultiWarehouseShortfall(models.Model):
+    """
+    Quantities of sales order lines that could not be sourced at confirmation.
+
+    The scheduler sources them again when stock appears. To avoid rescanning
+    every open shortfall on each run, quant and move updates mark their
+    products as dirty (multi_warehouse_dirty_product table, fed once per
+    transaction) and only the shortfalls of dirty products are revisited.
+    """
+    _name = 'multi.warehouse.shortfall'
+    _description = 'Multi-Warehouse Sourcing Shortfall'
+    _order = 'id'
+
+    sale_line_id = fields.Many2one('sale.order.line', string="Sales Order Line", required=True, index=True,
+                                   ondelete='cascade')
+    order_id = fields.Many2one(related='sale_line_id.order_id', string="Sales Order", store=True, index=True)
+    product_id = fields.Many2one('product.product', string="Product", required=True, ondelete='cascade')
+    quantity = fields.Float(string="Missing Quantity", digits='Product Unit of Measure', required=True)
+    state = fields.Selection([
+        ('open', 'Open'),
+        ('done', 'Sourced'),
+        ('cancel', 'Cancelled'),
+    ], string="Status", default='open', required=True)
+    last_attempt_date = fields.Datetime(string="Last Attempt", readonly=True)
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS multi_warehouse_shortfall_open_idx
+                ON multi_warehouse_shortfall (product_id)
+             WHERE state = 'open'
+        """)
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS multi_warehouse_dirty_product (
+                product_id INTEGER PRIMARY KEY
+            )
+        """)
+
+    @api.model
+    def _record(self, quantities):
+        """
+        Record the shortfall of sales order lines, replacing their open shortfall if any.
+
+        :param quantities: dict {sale.order.line: missing qty}
+        """
+        lines = self.env['sale.order.line'].union(*quantities) if quantities else self.env['sale.order.line']
+        existing = {
+            shortfall.sale_line_id: shortfall
+            for shortfall in self.sudo().search([('sale_line_id', 'in', lines.ids), ('state', '=', 'open')])
+        }
+        vals_list = []
+        for line, qty in quantities.items():
+            shortfall = existing.get(line)
+            if shortfall:
+                if qty > EPSILON:
+                    shortfall.quantity = qty
+                else:
+                    shortfall.state = 'done'
+            elif qty > EPSILON:
+                vals_list.append({'sale_line_id': line.id, 'product_id': line.product_id.id, 'quantity': qty})
+        return self.sudo().create(vals_list)
+
+    @api.model
+    def _mark_products_dirty(self, product_ids):
+        """
+        Remember that the stock of these products changed. Products are
+        collected for the whole transaction and saved with one query before
+        commit, keeping only those with open shortfalls.
+        """
+        if not product_ids:
+            return
+        precommit = self.env.cr.precommit
+        dirty_product_ids = precommit.data.get('multi_warehouse_dirty_product_ids')
+        if dirty_product_ids is None:
+            dirty_product_ids = precommit.data['multi_warehouse_dirty_product_ids'] = set()
+            cr = self.env.cr
+            precommit.add(lambda: self._flush_dirty_products(cr, dirty_product_ids))
+        dirty_product_ids.update(product_ids)
+
+    @api.model
+    def _flush_dirty_products(self, cr, product_ids):
+        if not product_ids:
+            return
+        cr.execute("""
+            INSERT INTO multi_warehouse_dirty_product (product_id)
+                 SELECT DISTINCT product_id
+                   FROM multi_warehouse_shortfall
+                  WHERE state = 'open'
+                    AND product_id = ANY(%s)
+            ON CONFLICT DO NOTHING
+        """, [sorted(product_ids)])
+        product_ids.clear()
+
+    @api.model
+    def _process_dirty_products(self, use_new_cursor=False, batch_size=100):
+        """
+        Source again the open shortfalls of the products whose stock changed
+        since the last run. Products are taken out of the dirty set as they
+        are processed; each order is sourced in its own savepoint.
+
+        :param use_new_cursor: commit after each batch of products (scheduler run)
+        """
+        while True:
+            self.env.cr.execute("""
+                DELETE FROM multi_warehouse_dirty_product
+                      WHERE product_id IN (
+                            SELECT product_id
+                              FROM multi_warehouse_dirty_product
+                          ORDER BY product_id
+                             LIMIT %s
+                               FOR UPDATE SKIP LOCKED)
+                  RETURNING product_id
+            """, [batch_size])
+            product_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not product_ids:
+                break
+            shortfalls = self.sudo().search([('product_id', 'in', product_ids), ('state', '=', 'open')])
+            shortfalls._source()
+            if not use_new_cursor:
+                continue
+            self.env.cr.commit()
+
+    def _source(self):
+        """ Try to source the missing quantities of these shortfalls, order by order. """
+        cancelled = self.filtered(lambda s: s.sale_line_id.order_id.state != 'sale')
+        cancelled.write({'state': 'cancel'})
+        shortfalls = self - cancelled
+        if not shortfalls:
+            return
+        shortfalls.write({'last_attempt_date': fields.Datetime.now()})
+        for order in shortfalls.order_id:
+            order_shortfalls = shortfalls.filtered(lambda s: s.order_id == order)
+            try:
+                with self.env.cr.savepoint():
+                    sourced = order_shortfalls.sale_line_id._source_multi_warehouse_shortfall({
+                        shortfall.sale_line_id: shortfall.quantity for shortfall in order_shortfalls
+                    })
+            except Exception:
+                _logger.warning("Could not source the shortfalls of order %s", order.name, exc_info=True)
+                continue
+            for shortfall in order_shortfalls:
+                remaining = shortfall.quantity - sourced.get(shortfall.sale_line_id, 0.0)
+                if remaining > EPSILON:
+                    shortfall.quantity = remaining
+                else:
+                    shortfall.state = 'done'
+
+    @api.autovacuum
+    def _gc_shortfalls(self):
+        self.sudo().search([('state', 'in', ('done', 'cancel'))]).unlink()
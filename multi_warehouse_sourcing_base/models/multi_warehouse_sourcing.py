@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+from collections import defaultdict
+
+from odoo import api, models
+from odoo.tools import float_compare, float_repr
+
+from ..tools import SourcingDemand, SourcingPlan, get_strategy
+
+_logger = logging.getLogger(__name__)
+
+
+class MultiWarehouseSourcing(models.AbstractModel):
+    """
+    Single-pass sourcing service shared by the multi-warehouse modules.
+
+    The modules do not run their own engine: they describe how each sales
+    order line is sourced (sale.order.line._get_multi_warehouse_sourcing_config)
+    and how an allocation is turned into stock moves (``_apply_<mode>``
+    methods of this model). For a batch of lines the service then
+
+    1. compares the ordered quantities with the existing source moves,
+       removing the excess and keeping only the missing quantities,
+    2. reads the availability of every product in every candidate warehouse
+       once (stock summary, minus the open allocations of other plans),
+    3. builds one plan per order with the order's sourcing strategy,
+    4. records the plan in the allocation ledger and the shortfall queue,
+    5. applies the allocations once, one batch per sourcing mode.
+    """
+    _name = 'multi.warehouse.sourcing'
+    _description = 'Multi-Warehouse Sourcing Service'
+
+    @api.model
+    def _source_lines(self, lines):
+        """
+        Bring the source moves of the lines in line with their ordered quantity.
+
+        :param lines: sale.order.line recordset, with a sourcing configuration
+        :return: the created source moves
+        """
+        precision = self.env['decimal.precision'].precision_get('Product Unit of Measure')
+        sourced_quantities = self._get_sourced_quantities(lines)
+        quantities_to_source = {}
+        quantities_to_unsource = {}
+        for line in lines:
+            delta = line.product_uom_qty - sourced_quantities[line]
+            if float_compare(delta, 0.0, precision_digits=precision) > 0:
+                quantities_to_source[line] = delta
+            elif float_compare(delta, 0.0, precision_digits=precision) < 0:
+                quantities_to_unsource[line] = -delta
+        unsourced = self._reduce(quantities_to_unsource)
+        moves = self._source(quantities_to_source)
+
+        # What could not be sourced now is sourced again by the scheduler once stock appears
+        newly_sourced = self._get_move_quantities(moves)
+        self.env['multi.warehouse.shortfall']._record({
+            line: max(line.product_uom_qty - sourced_quantities[line] + unsourced.get(line, 0.0)
+                      - newly_sourced.get(line, 0.0), 0.0)
+            for line in lines
+        })
+        return moves
+
+    @api.model
+    def _source(self, quantities):
+        """
+        Source quantities of sales order lines in a single pass.
+
+        :param quantities: dict {sale.order.line: qty to source, in the line unit of measure}
+        :return: the created source moves
+        """
+        StockMove = self.env['stock.move']
+        if not quantities:
+            return StockMove
+        Stat = self.env['multi.warehouse.sourcing.stat']
+        configs = {line: line._get_multi_warehouse_sourcing_config() for line in quantities}
+        quantities = {line: qty for line, qty in quantities.items() if configs[line]}
+        if not quantities:
+            return StockMove
+
+        with Stat._measure('availability') as measure:
+            availability_map = self._get_availability_map(quantities, configs)
+            measure['rows'] = len(availability_map)
+        with Stat._measure('plan') as measure:
+            plans = self._plan(quantities, configs, availability_map,
+                               log_decisions=self.env['multi.warehouse.sourcing.log']._is_enabled())
+            measure['rows'] = len(quantities)
+
+        # Soft-reserve the planned quantities so concurrent plans do not count them again
+        self.env['multi.warehouse.allocation']._allocate(
+            (line, warehouse_id, qty)
+            for line in quantities
+            for warehouse_id, qty in plans[line.order_id.id].get_allocation(line.id).items()
+        )
+
+        quantities_by_mode = defaultdict(dict)
+        for line, qty in quantities.items():
+            quantities_by_mode[configs[line]['mode']][line] = qty
+        moves = StockMove
+        for mode, mode_quantities in quantities_by_mode.items():
+            moves |= getattr(self, '_apply_%s' % mode)(mode_quantities, configs, plans)
+        return moves
+
+    @api.model
+    def _simulate(self, orders, cache_plans=False):
+        """
+        Dry run of the sourcing of orders (e.g. quotations), in the given order:
+        the plans of all orders are built against one in-memory availability
+        snapshot, each order consuming the stock planned for the previous ones.
+        Nothing is locked, and nothing is written unless cache_plans is set.
+
+        :param orders: sale.order recordset
+        :param cache_plans: keep the plans on the orders for their confirmation
+        :return: list of plain dicts, one per order::
+
+            {'order_id', 'order_name', 'shipment_count', 'warehouse_ids',
+             'lines': [{'line_id', 'product_id', 'quantity', 'shortfall',
+                        'allocations': [{'warehouse_id', 'warehouse_name', 'quantity'}]}]}
+        """
+        configs = {}
+        quantities = {}
+        for order in orders:
+            for line in order.order_line.filtered(lambda l: l.product_id.type == 'product'):
+                config = line._get_multi_warehouse_sourcing_config()
+                if config:
+                    configs[line] = config
+                    quantities[line] = line.product_uom_qty
+        availability_map = self._get_availability_map(quantities, configs, lock=False)
+        plans = self._plan(quantities, configs, availability_map, cache_plans=cache_plans)
+
+        warehouse_names = {
+            warehouse.id: warehouse.name
+            for warehouse in self.env['stock.warehouse'].browse({
+                warehouse_id for plan in plans.values() for warehouse_id in plan.warehouse_ids
+            })
+        }
+        lines_by_order = defaultdict(list)
+        for line in quantities:
+            lines_by_order[line.order_id.id].append(line)
+        result = []
+        for order in orders:
+            plan = plans.get(order.id)
+            result.append({
+                'order_id': order.id,
+                'order_name': order.name,
+                'shipment_count': plan.shipment_count if plan else 0,
+                'warehouse_ids': list(plan.warehouse_ids) if plan else [],
+                'lines': [{
+                    'line_id': line.id,
+                    'product_id': line.product_id.id,
+                    'quantity': quantities[line],
+                    'shortfall': plan.get_shortfall(line.id),
+                    'allocations': [{
+                        'warehouse_id': warehouse_id,
+                        'warehouse_name': warehouse_names[warehouse_id],
+                        'quantity': qty,
+                    } for warehouse_id, qty in plan.get_allocation(line.id).items()],
+                } for line in lines_by_order[order.id]],
+            })
+        return result
+
+    @api.model
+    def _get_availability_map(self, quantities, configs, lock=True):
+        """
+        Availability of the products of the lines in all their candidate warehouses,
+        minus the open allocations of other plans.
+
+        :param lock: lock the products in the allocation ledger until the end of
+            the transaction, required when the plan is applied
+        :return: dict {(product_id, warehouse_id): available qty}
+        """
+        Warehouse = self.env['stock.warehouse']
+        products = self.env['product.product'].union(*(line.product_id for line in quantities))
+        warehouses = Warehouse.browse({
+            warehouse_id for line in quantities for warehouse_id in configs[line]['warehouse_ids']
+        })
+        availability_map = self.env['multi.warehouse.stock.summary'].sudo()._get_available_quantities(
+            products, warehouses)
+        Allocation = self.env['multi.warehouse.allocation']
+        if not lock:
+            return Allocation._deduct_open_quantities(availability_map)
+        return Allocation._lock_and_deduct(availability_map)
+
+    @api.model
+    def _plan(self, quantities, configs, availability_map, cache_plans=False, log_decisions=False):
+        """
+        One plan per order, following the sourcing strategy of the order.
+
+        Warehouses whose open outbound work reached their daily capacity come
+        last in the candidate warehouses (only used on ties or for what the
+        others cannot cover) or, with the 'skip' capacity policy, are not
+        candidates at all unless no other warehouse is. The load of the
+        warehouses is read once from the capacity counters and increased with
+        each plan of the batch.
+
+        The plan cached on an order (see sale.order._preview_multi_warehouse_sourcing)
+        is reused instead of planning again when it was built for the same lines,
+        quantities and settings (key) and on the same candidate warehouses and
+        availability (stamp), since planning again would give the same result.
+
+        :param availability_map: consumed by the plans
+        :param cache_plans: keep the plans on the orders
+        :param log_decisions: record the plans in the sourcing decision log
+        :return: dict {order id: SourcingPlan keyed by sale.order.line id}
+        """
+        Warehouse = self.env['stock.warehouse']
+        lines_by_order = defaultdict(list)
+        for line in quantities:
+            lines_by_order[line.order_id].append(line)
+
+        capacity_warehouses = Warehouse.browse({
+            warehouse_id for line in quantities for warehouse_id in configs[line]['warehouse_ids']
+        }).filtered('sourcing_daily_capacity')
+        loads = self.env['multi.warehouse.capacity.counter'].sudo()._get_open_loads(capacity_warehouses.ids)
+        skip_saturated = self.env['ir.config_parameter'].sudo().get_param(
+            'multi_warehouse_sourcing_base.capacity_policy', 'deprioritize') == 'skip'
+
+        plans = {}
+        for order, lines in lines_by_order.items():
+            warehouses = Warehouse.browse({
+                warehouse_id for line in lines for warehouse_id in configs[line]['warehouse_ids']
+            }).filtered('lot_stock_id')._sort_for_sourcing()
+            warehouses = self._sort_by_capacity(warehouses, loads, skip_saturated)
+            demands = [
+                SourcingDemand(line.id, line.product_id.id, quantities[line], configs[line]['warehouse_ids'])
+                for line in lines
+            ]
+            strategy = get_strategy(order._get_multi_warehouse_sourcing_method())
+            if log_decisions:
+                # what the plan sees, before it consumes it
+                seen_availability = {
+                    (product_id, warehouse_id): availability_map.get((product_id, warehouse_id), 0.0)
+                    for product_id in {line.product_id.id for line in lines}
+                    for warehouse_id in warehouses.ids
+                }
+            plan = None
+            if cache_plans or order.multi_warehouse_plan_key:
+                plan_key = self._get_plan_key(order, lines, quantities, configs, strategy)
+                plan_stamp = self._get_plan_stamp(lines, warehouses, availability_map)
+                if (order.multi_warehouse_plan_key, order.multi_warehouse_plan_stamp) == (plan_key, plan_stamp):
+                    plan = SourcingPlan.from_dict(order.multi_warehouse_plan)
+                    self._consume_availability(availability_map, plan, lines)
+            if plan is None:
+                distances = order._get_warehouse_distances(warehouses) if strategy.needs_distances else None
+                plan = strategy.plan(demands, warehouses.ids, availability_map, distances=distances)
+                if cache_plans:
+                    order.sudo().write({
+                        'multi_warehouse_plan': plan.to_dict(),
+                        'multi_warehouse_plan_key': plan_key,
+                        'multi_warehouse_plan_stamp': plan_stamp,
+                    })
+            plans[order.id] = plan
+            if log_decisions:
+                self.env['multi.warehouse.sourcing.log']._log_plan(lines, plan, seen_availability, strategy.code)
+            if capacity_warehouses:
+                self._add_plan_loads(loads, plan, lines, capacity_warehouses.ids)
+        return plans
+
+    @api.model
+    def _get_plan_key(self, order, lines, quantities, configs, strategy):
+        """ :return: hash of what the plan of an order is computed from, stock aside """
+        precision = self.env['decimal.precision'].precision_get('Product Unit of Measure')
+        data = {
+            'method': strategy.code,
+            'lines': [
+                [line.id, line.product_id.id, float_repr(quantities[line], precision),
+                 configs[line]['mode'], sorted(configs[line]['warehouse_ids'])]
+                for line in sorted(lines, key=lambda l: l.id)
+            ],
+        }
+        if strategy.needs_distances:
+            partner = order.partner_shipping_id
+            data['destination'] = [partner.id, partner.partner_latitude, partner.partner_longitude]
+        return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+    @api.model
+    def _get_plan_stamp(self, lines, warehouses, availability_map):
+        """
+        :return: stock version stamp of a plan: hash of the candidate warehouses, in
+                 order of preference, and of the availability of the products in them
+        """
+        precision = self.env['decimal.precision'].precision_get('Product Unit of Measure')
+        product_ids = sorted({line.product_id.id for line in lines})
+        data = [warehouses.ids, [
+            float_repr(availability_map.get((product_id, warehouse_id), 0.0), precision)
+            for product_id in product_ids
+            for warehouse_id in warehouses.ids
+        ]]
+        return hashlib.sha1(json.dumps(data).encode()).hexdigest()
+
+    @api.model
+    def _consume_availability(self, availability_map, plan, lines):
+        """ Deduct the allocations of a plan from the availability, as planning does. """
+        for line in lines:
+            for warehouse_id, qty in plan.get_allocation(line.id).items():
+                key = (line.product_id.id, warehouse_id)
+                availability_map[key] = availability_map.get(key, 0.0) - qty
+
+    @api.model
+    def _sort_by_capacity(self, warehouses, loads, skip_saturated=False):
+        """
+        Move the saturated warehouses after the others, keeping their order.
+
+        :param loads: dict {warehouse_id: (open lines, open quantity)}
+        :param skip_saturated: drop the saturated warehouses, unless all are saturated
+        :return: stock.warehouse recordset
+        """
+        saturated_ids = warehouses._get_saturated_warehouse_ids(loads)
+        if not saturated_ids:
+            return warehouses
+        available = warehouses.filtered(lambda w: w.id not in saturated_ids)
+        if skip_saturated and available:
+            return available
+        return available + warehouses.filtered(lambda w: w.id in saturated_ids)
+
+    @api.model
+    def _add_plan_loads(self, loads, plan, lines, warehouse_ids):
+        """
+        Add the work of a plan to the loads of the warehouses, as the capacity
+        counters will once its moves are created.
+
+        :param loads: dict {warehouse_id: (open lines, open quantity)}, updated in place
+        """
+        for line in lines:
+            for warehouse_id, qty in plan.get_allocation(line.id).items():
+                if qty <= 0 or warehouse_id not in warehouse_ids:
+                    continue
+                open_lines, open_quantity = loads.get(warehouse_id, (0, 0.0))
+                loads[warehouse_id] = (
+                    open_lines + 1,
+                    open_quantity + line.product_uom._compute_quantity(qty, line.product_id.uom_id),
+                )
+
+    @api.model
+    def _get_source_moves(self, lines):
+        """ :return: the non-cancelled source moves of the lines, most recent first """
+        if not lines:
+            return self.env['stock.move']
+        return self.env['stock.move'].sudo().search([
+            ('sale_line_id', 'in', lines.ids),
+            ('is_multi_warehouse_source_move', '=', True),
+            ('state', '!=', 'cancel'),
+        ], order='id desc')
+
+    @api.model
+    def _get_move_quantities(self, moves):
+        """ :return: dict {sale.order.line: qty of the moves, in the line unit of measure} """
+        quantities = defaultdict(float)
+        for move in moves:
+            line = move.sale_line_id
+            quantities[line] += move.product_uom._compute_quantity(
+                move.product_uom_qty, line.product_uom, rounding_method='HALF-UP')
+        return quantities
+
+    @api.model
+    def _get_sourced_quantities(self, lines):
+        """ :return: dict {sale.order.line: qty covered by its non-cancelled source moves} """
+        sourced = dict.fromkeys(lines, 0.0)
+        sourced.update(self._get_move_quantities(self._get_source_moves(lines)))
+        return sourced
+
+    @api.model
+    def _reduce(self, quantities):
+        """
+        Remove quantities from the source moves of lines whose ordered quantity
+        decreased, starting with the most recently planned moves: moves that are
+        not needed anymore are cancelled, the last one is shrunk together with
+        the moves it feeds for the same line. Moves already done are left
+        untouched. Moves are cancelled, and shrunk moves reserved again, in one
+        batch.
+
+        :param quantities: dict {sale.order.line: qty to remove}
+        :return: dict {sale.order.line: qty actually removed}
+        """
+        if not quantities:
+            return {}
+        lines = self.env['sale.order.line'].union(*quantities)
+        precision = self.env['decimal.precision'].precision_get('Product Unit of Measure')
+        moves_to_cancel = self.env['stock.move']
+        new_quantities = {}
+        removed = dict.fromkeys(lines, 0.0)
+        for move in self._get_source_moves(lines).filtered(lambda m: m.state != 'done'):
+            line = move.sale_line_id
+            remaining = quantities[line] - removed[line]
+            if float_compare(remaining, 0.0, precision_digits=precision) <= 0:
+                continue
+            move_qty = move.product_uom._compute_quantity(
+                move.product_uom_qty, line.product_uom, rounding_method='HALF-UP')
+            chained_moves = move.move_dest_ids.filtered(
+                lambda m: m.sale_line_id == line and m.state not in ('done', 'cancel'))
+            if float_compare(move_qty, remaining, precision_digits=precision) <= 0:
+                moves_to_cancel |= move | chained_moves
+                removed[line] += move_qty
+            else:
+                for shrunk_move in move | chained_moves:
+                    new_quantities[shrunk_move] = line.product_uom._compute_quantity(
+                        move_qty - remaining, shrunk_move.product_uom, rounding_method='HALF-UP')
+                removed[line] += remaining
+        if moves_to_cancel:
+            moves_to_cancel._action_cancel()
+        if new_quantities:
+            moves_to_shrink = self.env['stock.move'].union(*new_quantities)
+            # Reservations are redone for the new demand
+            moves_to_shrink._do_unreserve()
+            for move, qty in new_quantities.items():
+                move.product_uom_qty = qty
+            moves_to_shrink._action_assign()
+        _logger.debug("Reduced multi-warehouse source moves: %s", removed)
+        return removed
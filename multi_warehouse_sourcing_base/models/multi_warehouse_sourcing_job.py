@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+# Crons processing the confirmation jobs: each runs in its own cron worker,
+# so that many partitions of a backlog are confirmed in parallel processes
+CONFIRMATION_CRON_XMLIDS = [
+    'multi_warehouse_sourcing_base.ir_cron_multi_warehouse_confirmation_jobs_%s' % index
+    for index in range(1, 5)
+]
+
+
+class MultiWarehouseSourcingJob(models.Model):
+    _name = 'multi.warehouse.sourcing.job'
+    _description = 'Multi-Warehouse Sourcing Job'
+    _order = 'id'
+
+    job_type = fields.Selection([
+        ('sourcing', 'Sourcing'),
+        ('confirmation', 'Order Confirmation'),
+    ], string="Type", default='sourcing', required=True, index=True, readonly=True)
+    order_id = fields.Many2one('sale.order', string="Sales Order", index=True, ondelete='cascade',
+                               help="Order sourced by a sourcing job.")
+    order_ids = fields.Many2many(
+        'sale.order', 'multi_warehouse_sourcing_job_order_rel', 'job_id', 'order_id', string="Orders to Confirm",
+        readonly=True, help="Partition of a backlog confirmed by a confirmation job.")
+    batch_reference = fields.Char(
+        string="Batch", readonly=True, index=True,
+        help="Parallel confirmation (sale.order.confirm_orders_in_parallel) the confirmation job is part of.")
+    chunk_size = fields.Integer(string="Chunk Size", readonly=True,
+                                help="Orders confirmed per transaction by a confirmation job, 0 for the default.")
+    report = fields.Json(string="Report", readonly=True, copy=False)
+    idempotency_key = fields.Char(
+        string="Idempotency Key", required=True, readonly=True,
+        help="Identifies one launch of the sourcing of the order (confirmation, launched lines and quantities): "
+             "enqueuing the same launch twice creates a single job.")
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string="Status", default='pending', required=True, index=True)
+    attempts = fields.Integer(string="Attempts", default=0, readonly=True)
+    next_attempt_date = fields.Datetime(string="Next Attempt", default=fields.Datetime.now, index=True)
+    last_error = fields.Text(string="Last Error", readonly=True)
+
+    _sql_constraints = [
+        ('idempotency_key_uniq', 'unique(idempotency_key)', 'A sourcing job already exists for this confirmation.'),
+    ]
+
+    @api.model
+    def _get_max_attempts(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(
+            'multi_warehouse_sourcing_base.job_max_attempts', 5))
+
+    @api.model
+    def _enqueue(self, orders, lines=None):
+        """
+        Create the pending jobs of the given orders, skipping the launches that
+        already have a pending or running job. A launch whose job is done is
+        queued again: the lines may have changed back to the same quantities
+        since, and sourcing only adds what is missing, so an extra run is harmless.
+
+        :param lines: sale.order.line being launched, all lines of the orders by default
+        :return: the jobs of the orders (new or existing)
+        """
+        keys = {
+            order._get_sourcing_job_key(lines.filtered(lambda l: l.order_id == order) if lines else None): order
+            for order in orders
+        }
+        existing = self.sudo().search([('idempotency_key', 'in', list(keys))])
+        existing.filtered(lambda j: j.state == 'done').write({
+            'state': 'pending',
+            'attempts': 0,
+            'next_attempt_date': fields.Datetime.now(),
+        })
+        existing_keys = set(existing.mapped('idempotency_key'))
+        jobs = existing | self.sudo().create([
+            {'order_id': order.id, 'idempotency_key': key}
+            for key, order in keys.items()
+            if key not in existing_keys
+        ])
+        jobs.filtered(lambda j: j.state == 'pending').order_id.write({
+            'multi_warehouse_sourcing_state': 'queued',
+        })
+        self.env.ref('multi_warehouse_sourcing_base.ir_cron_multi_warehouse_sourcing_jobs').sudo()._trigger()
+        return jobs
+
+    @api.model
+    def _enqueue_confirmation(self, partitions, batch_reference, chunk_size=None):
+        """
+        Create one confirmation job per partition of a backlog and wake up the
+        confirmation crons, one per partition (as many as there are crons).
+
+        :param partitions: list of lists of sale.order ids
+        :param batch_reference: reference shared by the jobs of the backlog
+        :param chunk_size: see sale.order.confirm_orders_in_batch
+        :return: the jobs
+        """
+        jobs = self.sudo().create([{
+            'job_type': 'confirmation',
+            'order_ids': [(6, 0, order_ids)],
+            'batch_reference': batch_reference,
+            'chunk_size': chunk_size or 0,
+            'idempotency_key': '%s-%s' % (batch_reference, index),
+        } for index, order_ids in enumerate(partitions)])
+        for xmlid in CONFIRMATION_CRON_XMLIDS[:len(partitions)]:
+            self.env.ref(xmlid).sudo()._trigger()
+        return jobs
+
+    @api.model
+    def _cron_process_jobs(self, batch_size=50, job_type='sourcing'):
+        """
+        Drain the queue by batches. Jobs are locked with SKIP LOCKED so several
+        crons (or workers calling this method) can process the queue in parallel.
+
+        :param job_type: type of the jobs to process, the confirmation crons take
+                 their jobs one at a time (batch_size=1) so that they share a backlog
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        while True:
+            # next_attempt_date is set from the clock, not from the start of the transaction
+            self.env.cr.execute("""
+                SELECT id
+                  FROM multi_warehouse_sourcing_job
+                 WHERE state = 'pending'
+                   AND job_type = %s
+                   AND next_attempt_date <= (clock_timestamp() at time zone 'UTC')
+              ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, [job_type, batch_size])
+            jobs = self.browse([row[0] for row in self.env.cr.fetchall()])
+            if not jobs:
+                break
+            if job_type == 'confirmation':
+                jobs._process_confirmation(auto_commit)
+            else:
+                jobs._process()
+            if not auto_commit:
+                break
+            self.env.cr.commit()
+
+    def _process(self):
+        max_attempts = self._get_max_attempts()
+        for job in self:
+            job.write({'state': 'running', 'attempts': job.attempts + 1})
+            job.order_id.multi_warehouse_sourcing_state = 'running'
+            try:
+                with self.env.cr.savepoint():
+                    job.order_id.with_context(multi_warehouse_sourcing_job=True)._run_multi_warehouse_sourcing()
+            except Exception as e:
+                _logger.warning("Sourcing job %s for %s failed (attempt %s/%s)",
+                                job.id, job.order_id.name, job.attempts, max_attempts, exc_info=True)
+                failed = job.attempts >= max_attempts
+                job.write({
+                    'state': 'failed' if failed else 'pending',
+                    'last_error': str(e),
+                    # retry with an increasing delay
+                    'next_attempt_date': fields.Datetime.now() + timedelta(minutes=2 ** job.attempts),
+                })
+                job.order_id.multi_warehouse_sourcing_state = 'failed' if failed else 'queued'
+                continue
+            job.write({'state': 'done', 'last_error': False})
+            job.order_id.multi_warehouse_sourcing_state = 'done'
+
+    def _process_confirmation(self, auto_commit=True):
+        """
+        Confirm the partitions of the jobs with confirm_orders_in_batch, which
+        commits after each chunk, and store its report on the job. The orders
+        are confirmed as the user who launched the backlog.
+        """
+        for job in self:
+            job.write({'state': 'running', 'attempts': job.attempts + 1})
+            if auto_commit:
+                self.env.cr.commit()
+            start = time.perf_counter()
+            try:
+                report = self.env['sale.order'].with_user(job.create_uid).confirm_orders_in_batch(
+                    job.order_ids.ids, chunk_size=job.chunk_size)
+            except Exception as e:
+                _logger.warning("Confirmation job %s of batch %s failed", job.id, job.batch_reference, exc_info=True)
+                if auto_commit:
+                    # the chunks confirmed before the error are committed, the job can be retried
+                    self.env.cr.rollback()
+                job.write({'state': 'failed', 'last_error': str(e)})
+                continue
+            report.update(orders=len(job.order_ids), duration=time.perf_counter() - start)
+            job.write({'state': 'done', 'report': report, 'last_error': False})
+
+    def action_retry(self):
+        self.filtered(lambda j: j.state == 'failed').write({
+            'state': 'pending',
+            'attempts': 0,
+            'next_attempt_date': fields.Datetime.now(),
+        })
+        self.order_id.multi_warehouse_sourcing_state = 'queued'
+        if any(job.job_type == 'sourcing' for job in self):
+            self.env.ref('multi_warehouse_sourcing_base.ir_cron_multi_warehouse_sourcing_jobs').sudo()._trigger()
+        if any(job.job_type == 'confirmation' for job in self):
+            for xmlid in CONFIRMATION_CRON_XMLIDS:
+                self.env.ref(xmlid).sudo()._trigger()
+        return True
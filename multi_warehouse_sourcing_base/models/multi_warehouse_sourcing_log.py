@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+EXPORT_COLUMNS = [
+    'date', 'order_id', 'order_name', 'sale_line_id', 'product_id', 'product_code',
+    'warehouse_id', 'warehouse_code', 'quantity', 'available_quantity', 'shortfall', 'strategy',
+]
+
+_EXPORT_QUERY = """
+    SELECT log.date, log.order_id, sale_order.name, log.sale_line_id, log.product_id, product.default_code,
+           log.warehouse_id, warehouse.code, log.quantity, log.available_quantity, log.shortfall, log.strategy
+      FROM multi_warehouse_sourcing_log log
+ LEFT JOIN sale_order ON sale_order.id = log.order_id
+ LEFT JOIN product_product product ON product.id = log.product_id
+ LEFT JOIN stock_warehouse warehouse ON warehouse.id = log.warehouse_id
+     WHERE log.date >= %s AND log.date < %s
+  ORDER BY log.date, log.id
+"""
+
+
+class MultiWarehouseSourcingLog(models.Model):
+    """
+    Append-only log of the sourcing decisions: one row per warehouse a line
+    was sourced from (and one without warehouse for a line that could not be
+    sourced at all), with the availability the plan saw and the shortfall.
+
+    Rows are buffered for the whole transaction and written before commit
+    with a single multi-row INSERT. The table is only appended to, read in
+    date ranges (BRIN index) and pruned by date.
+    """
+    _name = 'multi.warehouse.sourcing.log'
+    _description = 'Multi-Warehouse Sourcing Decision'
+    _order = 'date desc, id desc'
+    _log_access = False
+
+    date = fields.Datetime(string="Date", required=True, readonly=True)
+    order_id = fields.Many2one('sale.order', string="Sales Order", readonly=True, index=True, ondelete='set null')
+    sale_line_id = fields.Many2one('sale.order.line', string="Sales Order Line", readonly=True,
+                                   ondelete='set null')
+    product_id = fields.Many2one('product.product', string="Product", readonly=True, ondelete='set null')
+    warehouse_id = fields.Many2one('stock.warehouse', string="Warehouse", readonly=True, ondelete='set null')
+    quantity = fields.Float(string="Quantity", digits='Product Unit of Measure', readonly=True)
+    available_quantity = fields.Float(string="Availability Seen", digits='Product Unit of Measure', readonly=True,
+                                      help="Quantity the plan considered available in the warehouse.")
+    shortfall = fields.Float(string="Shortfall", digits='Product Unit of Measure', readonly=True,
+                             help="Quantity of the line that could not be sourced.")
+    strategy = fields.Char(string="Strategy", readonly=True)
+
+    def init(self):
+        # Rows are appended in date order: a BRIN index is tiny and enough for date ranges
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS multi_warehouse_sourcing_log_date_brin
+                ON multi_warehouse_sourcing_log USING brin (date)
+        """)
+
+    @api.model
+    def _is_enabled(self):
+        return self.env['ir.config_parameter'].sudo().get_param(
+            'multi_warehouse_sourcing_base.decision_log', 'True') != 'False'
+
+    @api.model
+    def _log_plan(self, lines, plan, availability, strategy):
+        """
+        Buffer the decisions of the plan of an order, written before commit.
+
+        :param lines: sale.order.line of the order that were planned
+        :param plan: SourcingPlan keyed by sale.order.line id
+        :param availability: dict {(product_id, warehouse_id): qty} as seen by the plan
+        :param strategy: code of the sourcing strategy
+        """
+        precommit = self.env.cr.precommit
+        buffer = precommit.data.get('multi_warehouse_sourcing_log')
+        if buffer is None:
+            buffer = precommit.data['multi_warehouse_sourcing_log'] = []
+            precommit.add(self._flush_buffer)
+        now = fields.Datetime.now()
+        for line in lines:
+            shortfall = plan.get_shortfall(line.id)
+            allocation = plan.get_allocation(line.id) or {None: 0.0}
+            for warehouse_id, qty in allocation.items():
+                buffer.append((
+                    now, line.order_id.id, line.id, line.product_id.id, warehouse_id, qty,
+                    availability.get((line.product_id.id, warehouse_id), 0.0), shortfall, strategy,
+                ))
+
+    @api.model
+    def _flush_buffer(self):
+        """ Write the decisions buffered in the current transaction, in one statement. """
+        buffer = self.env.cr.precommit.data.pop('multi_warehouse_sourcing_log', None)
+        if not buffer:
+            return
+        self.env.cr.execute("""
+            INSERT INTO multi_warehouse_sourcing_log
+                        (date, order_id, sale_line_id, product_id, warehouse_id, quantity, available_quantity,
+                         shortfall, strategy)
+                 SELECT * FROM unnest(%s::timestamp[], %s::int[], %s::int[], %s::int[], %s::int[],
+                                      %s::float8[], %s::float8[], %s::float8[], %s::varchar[])
+        """, [list(column) for column in zip(*buffer)])
+
+    @api.model
+    def _iter_export(self, date_from, date_to, file_format='csv', batch_size=5000):
+        """
+        Export the decisions of a date range, as chunks of CSV or JSON Lines text.
+
+        The rows are read through a server-side cursor, batch_size at a time,
+        so that the memory used does not depend on the size of the range.
+
+        :param date_from: start of the range (included), datetime or string
+        :param date_to: end of the range (excluded), datetime or string
+        :param file_format: 'csv' or 'jsonl'
+        :return: generator of str, one chunk per batch (plus the CSV header)
+        """
+        cr = self.env.cr
+        cursor_name = 'multi_warehouse_sourcing_log_export_%s' % id(cr)
+        cr.execute("DECLARE %s NO SCROLL CURSOR FOR %s" % (cursor_name, _EXPORT_QUERY), [
+            fields.Datetime.to_datetime(date_from), fields.Datetime.to_datetime(date_to),
+        ])
+        try:
+            if file_format == 'csv':
+                output = io.StringIO()
+                csv.writer(output).writerow(EXPORT_COLUMNS)
+                yield output.getvalue()
+            while True:
+                cr.execute("FETCH %s FROM %s" % (int(batch_size), cursor_name))
+                rows = cr.fetchall()
+                if not rows:
+                    break
+                output = io.StringIO()
+                if file_format == 'csv':
+                    csv.writer(output).writerows(
+                        [fields.Datetime.to_string(row[0])] + list(row[1:]) for row in rows)
+                else:
+                    for row in rows:
+                        output.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str))
+                        output.write('\n')
+                yield output.getvalue()
+        finally:
+            cr.execute("CLOSE %s" % cursor_name)
+
+    @api.autovacuum
+    def _gc_logs(self):
+        """ Prune the decisions older than the retention period. """
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'multi_warehouse_sourcing_base.decision_log_retention_days', 180))
+        self.env.cr.execute("""
+            DELETE FROM multi_warehouse_sourcing_log
+             WHERE date < %s
+        """, [fields.Datetime.now() - timedelta(days=retention_days)])
+        self.invalidate_model()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from odoo import SUPERUSER_ID, api, fields, models
+
+_logger = logging.getLogger(__name__)
+# Structured per-phase events, enable with --log-handler=odoo.addons.multi_warehouse_sourcing_base.phase:DEBUG
+_phase_logger = logging.getLogger('odoo.addons.multi_warehouse_sourcing_base.phase')
+
+# Seconds between two flushes of the in-process counters to the database
+FLUSH_INTERVAL = 60
+
+_lock = threading.Lock()
+# {dbname: {(phase, period start): [calls, total_time, max_time, queries, rows]}}
+_pending_stats = defaultdict(dict)
+_last_flush = {}
+
+
+class MultiWarehouseSourcingStat(models.Model):
+    """
+    Aggregated timings of the sourcing phases.
+
+    Phases are measured with ``_measure``; counters are accumulated in memory,
+    in the hour of each measure, and written in bulk, from a separate cursor
+    after commit, at most once per FLUSH_INTERVAL and per process (or as soon
+    as an hour is over), so measuring adds no query to the measured
+    transaction. A cron also flushes the counters of the process running it.
+    """
+    _name = 'multi.warehouse.sourcing.stat'
+    _description = 'Multi-Warehouse Sourcing Statistics'
+    _order = 'period_start desc, phase'
+
+    phase = fields.Char(string="Phase", required=True, index=True)
+    period_start = fields.Datetime(string="Period", required=True, index=True)
+    calls = fields.Integer(string="Calls", group_operator='sum')
+    total_time = fields.Float(string="Total Time (ms)", digits=(16, 2), group_operator='sum')
+    max_time = fields.Float(string="Max Time (ms)", digits=(16, 2), group_operator='max')
+    avg_time = fields.Float(string="Average Time (ms)", digits=(16, 2), compute='_compute_averages')
+    query_count = fields.Integer(string="SQL Queries", group_operator='sum')
+    avg_query_count = fields.Float(string="Queries per Call", digits=(16, 1), compute='_compute_averages')
+    row_count = fields.Integer(string="Rows", group_operator='sum',
+                               help="Records created or processed by the phase.")
+
+    @api.depends('calls', 'total_time', 'query_count')
+    def _compute_averages(self):
+        for stat in self:
+            stat.avg_time = stat.total_time / stat.calls if stat.calls else 0.0
+            stat.avg_query_count = stat.query_count / stat.calls if stat.calls else 0.0
+
+    @api.model
+    @contextmanager
+    def _measure(self, phase, **info):
+        """
+        Measure wall time and SQL queries of a block::
+
+            with self.env['multi.warehouse.sourcing.stat']._measure('plan') as measure:
+                ...
+                measure['rows'] = len(records)
+
+        :param phase: name of the phase
+        :param info: extra values added to the structured log event
+        """
+        cr = self.env.cr
+        measure = {'rows': 0}
+        queries_before = cr.sql_log_count
+        start = time.perf_counter()
+        try:
+            yield measure
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            queries = cr.sql_log_count - queries_before
+            self._record(phase, duration, queries, measure['rows'])
+            if _phase_logger.isEnabledFor(logging.DEBUG):
+                _phase_logger.debug("%s", json.dumps(dict(
+                    info, event='sourcing.phase', phase=phase, db=cr.dbname,
+                    ms=round(duration, 2), queries=queries, rows=measure['rows'],
+                ), default=str))
+
+    @api.model
+    def _record(self, phase, duration, queries, rows):
+        dbname = self.env.cr.dbname
+        period_start = fields.Datetime.now().replace(minute=0, second=0)
+        with _lock:
+            pending = _pending_stats[dbname]
+            # a bucket of a past hour is complete: no need to wait for the interval
+            hour_over = any(start < period_start for _phase, start in pending)
+            counters = pending.setdefault((phase, period_start), [0, 0.0, 0.0, 0, 0])
+            counters[0] += 1
+            counters[1] += duration
+            counters[2] = max(counters[2], duration)
+            counters[3] += queries
+            counters[4] += rows
+            last_flush = _last_flush.setdefault(dbname, time.time())
+        postcommit = self.env.cr.postcommit
+        flush_due = hour_over or time.time() - last_flush >= FLUSH_INTERVAL
+        if flush_due and not postcommit.data.get('multi_warehouse_stat_flush'):
+            postcommit.data['multi_warehouse_stat_flush'] = True
+            registry = self.env.registry
+            postcommit.add(lambda: self._flush_stats(registry))
+
+    @api.model
+    def _flush_stats(self, registry):
+        """ Write the in-process counters of the registry's database, in a new cursor. """
+        with _lock:
+            pending = _pending_stats.pop(registry.db_name, {})
+            _last_flush[registry.db_name] = time.time()
+        if not pending:
+            return
+        try:
+            with registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                env['multi.warehouse.sourcing.stat'].create([{
+                    'phase': phase,
+                    'period_start': period_start,
+                    'calls': calls,
+                    'total_time': total_time,
+                    'max_time': max_time,
+                    'query_count': queries,
+                    'row_count': rows,
+                } for (phase, period_start), (calls, total_time, max_time, queries, rows) in pending.items()])
+        except Exception:
+            _logger.warning("Could not save the multi-warehouse sourcing statistics", exc_info=True)
+
+    @api.model
+    def _cron_flush_stats(self):
+        """ Flush the counters of this process, even if it measured nothing for a while. """
+        registry = self.env.registry
+        self.env.cr.postcommit.add(lambda: self._flush_stats(registry))
+
+    @api.autovacuum
+    def _gc_stats(self):
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'multi_warehouse_sourcing_base.stat_retention_days', 90))
+        self.sudo().search([
+            ('period_start', '<', fields.Datetime.subtract(fields.Datetime.now(), days=retention_days)),
+        ]).unlink()
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from odoo import api, fields, models
+
+# Per (product, warehouse, lot) totals of the quants located under the
+# warehouse stock location, replacing the summary rows of the products (and
+# the changes not folded yet, which the totals already include).
+_REBUILD_QUERY = """
+    WITH folded AS (
+        DELETE FROM multi_warehouse_stock_delta delta
+         WHERE {delta_filter}
+    ), fresh AS (
+        SELECT quant.product_id,
+               warehouse.id AS warehouse_id,
+               quant.lot_id,
+               SUM(quant.quantity) AS quantity,
+               SUM(quant.reserved_quantity) AS reserved_quantity
+          FROM stock_quant quant
+          JOIN stock_location location ON location.id = quant.location_id
+          JOIN stock_location stock_root ON location.parent_path LIKE stock_root.parent_path || '%%'
+          JOIN stock_warehouse warehouse ON warehouse.lot_stock_id = stock_root.id
+         WHERE {quant_filter}
+      GROUP BY quant.product_id, warehouse.id, quant.lot_id
+    ), stale AS (
+        DELETE FROM multi_warehouse_stock_summary summary
+         WHERE {summary_filter}
+           AND NOT EXISTS (
+                SELECT 1
+                  FROM fresh
+                 WHERE fresh.product_id = summary.product_id
+                   AND fresh.warehouse_id = summary.warehouse_id
+                   AND fresh.lot_id IS NOT DISTINCT FROM summary.lot_id)
+    )
+    INSERT INTO multi_warehouse_stock_summary
+                (product_id, warehouse_id, lot_id, quantity, reserved_quantity, available_quantity, last_update)
+         SELECT product_id, warehouse_id, lot_id, quantity, reserved_quantity,
+                GREATEST(quantity - reserved_quantity, 0), now() at time zone 'UTC'
+           FROM fresh
+    ON CONFLICT (product_id, warehouse_id, COALESCE(lot_id, 0)) DO UPDATE
+            SET quantity = EXCLUDED.quantity,
+                reserved_quantity = EXCLUDED.reserved_quantity,
+                available_quantity = EXCLUDED.available_quantity,
+                last_update = EXCLUDED.last_update
+"""
+
+
+class MultiWarehouseStockSummary(models.Model):
+    """
+    Materialized availability of every product in every warehouse.
+
+    One row per (product, warehouse, lot) with stock under the warehouse stock
+    location, so sourcing reads an indexed point query instead of aggregating
+    the quants of the whole location tree.
+
+    Quant changes do not update the summary rows: they append their signed
+    quantities to the insert-only multi_warehouse_stock_delta table, so
+    concurrent reservations never wait on each other for a summary row.
+    Reads add the changes not folded yet to the summary rows, without writing
+    anything. A cron folds the changes into the summary, and ``_rebuild``
+    recomputes products from the quants, daily as a safety net and when
+    locations move from a warehouse to another.
+    """
+    _name = 'multi.warehouse.stock.summary'
+    _description = 'Multi-Warehouse Stock Summary'
+    _order = 'product_id, warehouse_id, lot_id'
+    _log_access = False
+
+    product_id = fields.Many2one('product.product', string="Product", required=True, readonly=True,
+                                 ondelete='cascade')
+    warehouse_id = fields.Many2one('stock.warehouse', string="Warehouse", required=True, readonly=True,
+                                   index=True, ondelete='cascade')
+    lot_id = fields.Many2one('stock.lot', string="Lot/Serial Number", readonly=True, ondelete='cascade')
+    quantity = fields.Float(string="On Hand", digits='Product Unit of Measure', readonly=True)
+    reserved_quantity = fields.Float(string="Reserved", digits='Product Unit of Measure', readonly=True)
+    available_quantity = fields.Float(string="Available", digits='Product Unit of Measure', readonly=True)
+    last_update = fields.Datetime(string="Last Updated", readonly=True)
+
+    def init(self):
+        # Point lookups and the ON CONFLICT target of the fold and rebuild statements
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS multi_warehouse_stock_summary_product_warehouse_lot_uniq
+                ON multi_warehouse_stock_summary (product_id, warehouse_id, COALESCE(lot_id, 0));
+            CREATE TABLE IF NOT EXISTS multi_warehouse_stock_delta (
+                id bigserial PRIMARY KEY,
+                product_id integer NOT NULL REFERENCES product_product (id) ON DELETE CASCADE,
+                warehouse_id integer NOT NULL REFERENCES stock_warehouse (id) ON DELETE CASCADE,
+                lot_id integer REFERENCES stock_lot (id) ON DELETE CASCADE,
+                quantity double precision NOT NULL DEFAULT 0,
+                reserved_quantity double precision NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS multi_warehouse_stock_delta_product_warehouse_index
+                ON multi_warehouse_stock_delta (product_id, warehouse_id);
+        """)
+        # Fill the table when the module is installed, it is then kept up to date by the deltas
+        self.env.cr.execute("SELECT 1 FROM multi_warehouse_stock_summary LIMIT 1")
+        if not self.env.cr.fetchone():
+            self._rebuild()
+
+    @api.model
+    def _add_deltas(self, deltas):
+        """
+        Append quant changes to the delta table, one multi-row INSERT.
+
+        :param deltas: list of (product_id, location_id, lot_id, quantity, reserved_quantity),
+                 the quantities being signed
+        """
+        totals = defaultdict(lambda: [0.0, 0.0])
+        for product_id, location_id, lot_id, quantity, reserved_quantity in deltas:
+            total = totals[(product_id, location_id, lot_id or None)]
+            total[0] += quantity
+            total[1] += reserved_quantity
+        rows = [key + tuple(total) for key, total in totals.items() if total[0] or total[1]]
+        if not rows:
+            return
+        self.env['stock.location'].flush_model(['parent_path'])
+        self.env['stock.warehouse'].flush_model(['lot_stock_id'])
+        self.env.cr.execute("""
+            INSERT INTO multi_warehouse_stock_delta (product_id, warehouse_id, lot_id, quantity, reserved_quantity)
+                 SELECT delta.product_id, warehouse.id, delta.lot_id, delta.quantity, delta.reserved_quantity
+                   FROM unnest(%s::int[], %s::int[], %s::int[], %s::float8[], %s::float8[])
+                        AS delta (product_id, location_id, lot_id, quantity, reserved_quantity)
+                   JOIN stock_location location ON location.id = delta.location_id
+                   JOIN stock_warehouse warehouse ON TRUE
+                   JOIN stock_location stock_root ON stock_root.id = warehouse.lot_stock_id
+                  WHERE location.parent_path LIKE stock_root.parent_path || '%%'
+        """, [list(column) for column in zip(*rows)])
+
+    @api.model
+    def _fold_deltas(self):
+        """ Add the appended quant changes to the summary rows, and drop them. """
+        self.env.cr.execute("""
+            WITH folded AS (
+                DELETE FROM multi_warehouse_stock_delta
+                  RETURNING product_id, warehouse_id, lot_id, quantity, reserved_quantity
+            ), totals AS (
+                SELECT product_id, warehouse_id, lot_id,
+                       SUM(quantity) AS quantity, SUM(reserved_quantity) AS reserved_quantity
+                  FROM folded
+              GROUP BY product_id, warehouse_id, lot_id
+            )
+            INSERT INTO multi_warehouse_stock_summary AS summary
+                        (product_id, warehouse_id, lot_id, quantity, reserved_quantity, available_quantity,
+                         last_update)
+                 SELECT product_id, warehouse_id, lot_id, quantity, reserved_quantity,
+                        GREATEST(quantity - reserved_quantity, 0), now() at time zone 'UTC'
+                   FROM totals
+               ORDER BY product_id, warehouse_id, lot_id
+            ON CONFLICT (product_id, warehouse_id, COALESCE(lot_id, 0)) DO UPDATE
+                    SET quantity = summary.quantity + EXCLUDED.quantity,
+                        reserved_quantity = summary.reserved_quantity + EXCLUDED.reserved_quantity,
+                        available_quantity = GREATEST(summary.quantity + EXCLUDED.quantity
+                                                      - summary.reserved_quantity - EXCLUDED.reserved_quantity, 0),
+                        last_update = EXCLUDED.last_update
+        """)
+        # Quantities of the fold are sums of floats: empty rows are near zero, not zero
+        self.env.cr.execute("""
+            DELETE FROM multi_warehouse_stock_summary
+             WHERE ABS(quantity) < 1e-9
+               AND ABS(reserved_quantity) < 1e-9
+        """)
+        self.invalidate_model()
+
+    @api.model
+    def _cron_fold_deltas(self):
+        self._fold_deltas()
+
+    @api.model
+    def _rebuild(self, product_ids=None):
+        """
+        Recompute products from the quants, in one statement.
+
+        :param product_ids: ids of the products to recompute, None for all of them
+        """
+        self.env['stock.quant'].flush_model(['product_id', 'location_id', 'lot_id', 'quantity', 'reserved_quantity'])
+        self.env['stock.location'].flush_model(['parent_path'])
+        self.env['stock.warehouse'].flush_model(['lot_stock_id'])
+        if product_ids is None:
+            query = _REBUILD_QUERY.format(delta_filter='TRUE', quant_filter='TRUE', summary_filter='TRUE')
+            params = []
+        else:
+            query = _REBUILD_QUERY.format(
+                delta_filter='delta.product_id = ANY(%s)',
+                quant_filter='quant.product_id = ANY(%s)',
+                summary_filter='summary.product_id = ANY(%s)',
+            )
+            params = [list(product_ids)] * 3
+        self.env.cr.execute(query, params)
+        self.invalidate_model()
+
+    @api.model
+    def _cron_rebuild(self):
+        self._rebuild()
+
+    @api.model
+    def _rebuild_locations(self, locations, warehouses=None):
+        """
+        Recompute the products stored under locations which moved to another
+        warehouse, and those of warehouses whose stock location changed.
+
+        :param locations: stock.location recordset (their children are included)
+        :param warehouses: optional stock.warehouse recordset
+        """
+        product_ids = {
+            product.id
+            for [product] in self.env['stock.quant'].sudo()._read_group(
+                [('location_id', 'child_of', locations.ids)], ['product_id'])
+        }
+        if warehouses:
+            self.env.cr.execute("""
+                SELECT product_id FROM multi_warehouse_stock_summary WHERE warehouse_id = ANY(%s)
+                 UNION
+                SELECT product_id FROM multi_warehouse_stock_delta WHERE warehouse_id = ANY(%s)
+            """, [warehouses.ids, warehouses.ids])
+            product_ids.update(product_id for [product_id] in self.env.cr.fetchall())
+        if product_ids:
+            self._rebuild(sorted(product_ids))
+
+    @api.model
+    def _get_available_quantities(self, products, warehouses):
+        """
+        Read only: the changes not folded yet are added to the summary rows.
+        Available quantities are clamped per lot, as in
+        stock.quant._get_available_quantity.
+
+        :param products: product.product recordset
+        :param warehouses: stock.warehouse recordset
+        :return: dict {(product_id, warehouse_id): float available_qty}.
+                 Every requested pair is present, missing stock maps to 0.0.
+        """
+        result = {
+            (product_id, warehouse_id): 0.0
+            for product_id in products.ids
+            for warehouse_id in warehouses.ids
+        }
+        if not result:
+            return result
+        self.env.cr.execute("""
+            SELECT product_id, warehouse_id, SUM(GREATEST(quantity - reserved_quantity, 0))
+              FROM (
+                    SELECT product_id, warehouse_id, lot_id,
+                           SUM(quantity) AS quantity, SUM(reserved_quantity) AS reserved_quantity
+                      FROM (
+                            SELECT product_id, warehouse_id, lot_id, quantity, reserved_quantity
+                              FROM multi_warehouse_stock_summary
+                             WHERE product_id = ANY(%(product_ids)s)
+                               AND warehouse_id = ANY(%(warehouse_ids)s)
+                         UNION ALL
+                            SELECT product_id, warehouse_id, lot_id, quantity, reserved_quantity
+                              FROM multi_warehouse_stock_delta
+                             WHERE product_id = ANY(%(product_ids)s)
+                               AND warehouse_id = ANY(%(warehouse_ids)s)
+                           ) stock
+                  GROUP BY product_id, warehouse_id, lot_id
+                   ) per_lot
+          GROUP BY product_id, warehouse_id
+        """, {'product_ids': products.ids, 'warehouse_ids': warehouses.ids})
+        for product_id, warehouse_id, available_qty in self.env.cr.fetchall():
+            result[(product_id, warehouse_id)] = available_qty or 0.0
+        return result
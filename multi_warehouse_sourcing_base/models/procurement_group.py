@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+
+class ProcurementGroup(models.Model):
+    _inherit = 'procurement.group'
+
+    @api.model
+    def _run_scheduler_tasks(self, use_new_cursor=False, company_id=False):
+        res = super()._run_scheduler_tasks(use_new_cursor=use_new_cursor, company_id=company_id)
+        # Source again the shortfalls of the products whose stock changed since the last run
+        self.env['multi.warehouse.shortfall']._process_dirty_products(use_new_cursor=use_new_cursor)
+        return res
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from odoo import fields, models
+
+
+class ResConfigSettings(models.TransientModel):
+    _inherit = 'res.config.settings'
+
+    multi_warehouse_async_sourcing = fields.Boolean(
+        string="Background Multi-Warehouse Sourcing",
+        config_parameter='multi_warehouse_sourcing_base.async_sourcing',
+        help="Confirmation only queues the multi-warehouse sourcing, which is then done by a scheduled action.",
+    )
+
+    multi_warehouse_capacity_policy = fields.Selection(
+        [
+            ('deprioritize', 'Use them last'),
+            ('skip', 'Skip them'),
+        ],
+        string="Saturated Warehouses",
+        default='deprioritize',
+        config_parameter='multi_warehouse_sourcing_base.capacity_policy',
+        help="How multi-warehouse sourcing treats warehouses whose open outbound work reached "
+             "their daily picking capacity. Skipped warehouses are still used when all the "
+             "warehouses an order can be sourced from are saturated.",
+    )
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from psycopg2 import OperationalError
+
+from odoo import api, fields, models
+from odoo.service.model import MAX_TRIES_ON_CONCURRENCY_FAILURE, PG_CONCURRENCY_ERRORS_TO_RETRY
+from odoo.tools import split_every
+
+from ..tools import partition_by_footprint
+
+_logger = logging.getLogger(__name__)
+
+
+class SaleOrder(models.Model):
+    _inherit = 'sale.order'
+
+    multi_warehouse_sourcing_state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'In Progress'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string="Multi-Warehouse Sourcing", copy=False, readonly=True,
+        help="Progress of the multi-warehouse sourcing when it runs in the background.")
+    multi_warehouse_sourcing_job_ids = fields.One2many(
+        'multi.warehouse.sourcing.job', 'order_id', string="Sourcing Jobs", copy=False)
+    # Sourcing plan computed ahead of confirmation (e.g. cart preview), reused by the
+    # sourcing service as long as the order and the stock it was planned on are unchanged
+    multi_warehouse_plan = fields.Json(string="Cached Sourcing Plan", copy=False, readonly=True)
+    multi_warehouse_plan_key = fields.Char(string="Cached Sourcing Plan Key", copy=False, readonly=True)
+    multi_warehouse_plan_stamp = fields.Char(string="Cached Sourcing Plan Stock Stamp", copy=False, readonly=True)
+
+    @api.model
+    def _is_multi_warehouse_sourcing_async(self):
+        """
+        Whether multi-warehouse sourcing must be deferred to a background job.
+        Always False inside the job itself.
+        """
+        if self.env.context.get('multi_warehouse_sourcing_job'):
+            return False
+        return bool(self.env['ir.config_parameter'].sudo().get_param('multi_warehouse_sourcing_base.async_sourcing'))
+
+    def _get_sourcing_job_key(self, lines=None):
+        """
+        Idempotency key of a launch of the multi-warehouse sourcing of the order:
+        the confirmation, with the launched lines and their quantities, so that a
+        later change of the lines (e.g. a quantity increase) gets its own job.
+
+        :param lines: sale.order.line of the order being launched, all lines by default
+        """
+        self.ensure_one()
+        lines = self.order_line if lines is None else lines
+        digest = hashlib.sha1(repr(sorted(
+            (line.id, line.product_uom_qty) for line in lines
+        )).encode()).hexdigest()[:16]
+        return "sale.order-%s-%s-%s" % (self.id, fields.Datetime.to_string(self.date_order), digest)
+
+    def _enqueue_multi_warehouse_sourcing(self, lines=None):
+        """
+        Defer the multi-warehouse sourcing of these orders to the job queue.
+
+        :param lines: sale.order.line being launched, all lines of the orders by default
+        """
+        return self.env['multi.warehouse.sourcing.job']._enqueue(self, lines)
+
+    def _run_multi_warehouse_sourcing(self):
+        """
+        Run the multi-warehouse sourcing deferred at confirmation. Called by
+        the job queue with the 'multi_warehouse_sourcing_job' context key set.
+        Lines already sourced are left as they are.
+        """
+        lines = self.order_line.filtered(
+            lambda l: l.product_id.type == 'product' and l._get_multi_warehouse_sourcing_config())
+        if lines:
+            lines._action_launch_stock_rule()
+        return True
+
+    @api.model
+    def simulate_multi_warehouse_sourcing(self, order_ids):
+        """
+        Preview how orders (typically quotations) would be split across
+        warehouses, without creating or reserving anything. Orders are planned
+        in the given order, against the same availability snapshot.
+
+        :param order_ids: list of sale.order ids
+        :return: list of plain dicts, see multi.warehouse.sourcing._simulate
+        """
+        return self.env['multi.warehouse.sourcing']._simulate(self.browse(order_ids).exists())
+
+    def _preview_multi_warehouse_sourcing(self):
+        """
+        Plan the sourcing of this order without creating or reserving anything,
+        and keep the plan on the order so that confirmation can reuse it.
+
+        :return: plain dict, see multi.warehouse.sourcing._simulate
+        """
+        self.ensure_one()
+        return self.env['multi.warehouse.sourcing']._simulate(self, cache_plans=True)[0]
+
+    def _action_confirm(self):
+        with self.env['multi.warehouse.sourcing.stat']._measure('action_confirm') as measure:
+            measure['rows'] = len(self)
+            return super()._action_confirm()
+
+    def _get_multi_warehouse_sourcing_method(self):
+        """
+        Code of the sourcing strategy planning this order (see tools.strategies).
+        Overridden by the modules providing a configuration.
+        """
+        self.ensure_one()
+        return 'availability'
+
+    def _get_warehouse_distances(self, warehouses):
+        """
+        Distance from each warehouse to the delivery address, used by the
+        distance-based strategies.
+
+        :return: dict {warehouse_id: distance}, warehouses with unknown distance are omitted
+        """
+        self.ensure_one()
+        return {}
+
+    @api.model
+    def confirm_orders_in_batch(self, order_ids, chunk_size=None):
+        """
+        Confirm many orders (e.g. imported from marketplaces) by chunks.
+
+        Each chunk is confirmed with a single action_confirm, so the sourcing
+        overrides share one availability snapshot and create the moves of the
+        whole chunk in one pass. When a chunk fails, its orders are confirmed
+        again one by one, each in its own savepoint, so one bad order does not
+        block the others. The transaction is committed after every chunk; a
+        chunk hitting a concurrency error (serialization failure, deadlock,
+        lock not available) is rolled back and tried again a bounded number
+        of times.
+
+        Meant to be called over XML-RPC/JSON-RPC::
+
+            models.execute_kw(db, uid, pwd, 'sale.order', 'confirm_orders_in_batch', [order_ids])
+
+        :param order_ids: list of sale.order ids; orders that are not draft/sent are ignored
+        :param chunk_size: number of orders per chunk, defaults to the
+                 'multi_warehouse_sourcing_base.batch_confirm_chunk_size' parameter (100)
+        :return: dict {'confirmed': [order ids], 'failed': [{'id', 'name', 'error'}],
+                 'retries': number of chunk retries}
+        """
+        if not chunk_size:
+            chunk_size = int(self.env['ir.config_parameter'].sudo().get_param(
+                'multi_warehouse_sourcing_base.batch_confirm_chunk_size', 100))
+        orders = self.browse(order_ids).exists().filtered(lambda o: o.state in ('draft', 'sent'))
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        result = {'confirmed': [], 'failed': [], 'retries': 0}
+        for chunk_ids in split_every(chunk_size, orders.ids):
+            chunk = self.browse(chunk_ids)
+            tries = 0
+            while True:
+                try:
+                    confirmed, failed = chunk._confirm_chunk()
+                    break
+                except OperationalError as e:
+                    if not auto_commit or e.pgcode not in PG_CONCURRENCY_ERRORS_TO_RETRY \
+                            or tries >= MAX_TRIES_ON_CONCURRENCY_FAILURE:
+                        raise
+                    tries += 1
+                    result['retries'] += 1
+                    # only the current chunk is lost, the previous ones are committed
+                    self.env.cr.rollback()
+                    wait_time = random.uniform(0.0, 2 ** tries)
+                    _logger.info("Concurrency error while confirming %s orders, retry %s/%s in %.3fs",
+                                 len(chunk), tries, MAX_TRIES_ON_CONCURRENCY_FAILURE, wait_time)
+                    time.sleep(wait_time)
+            result['confirmed'] += confirmed.ids
+            result['failed'] += failed
+            if auto_commit:
+                self.env.cr.commit()
+            _logger.info("Batch confirmation: %s orders confirmed, %s failed so far",
+                         len(result['confirmed']), len(result['failed']))
+        return result
+
+    def _confirm_chunk(self):
+        """
+        Confirm these orders together, or one by one if that fails.
+
+        :return: tuple (confirmed sale.order recordset, list of failure dicts)
+        """
+        try:
+            with self.env.cr.savepoint():
+                self.action_confirm()
+            return self, []
+        except OperationalError as e:
+            if e.pgcode in PG_CONCURRENCY_ERRORS_TO_RETRY:
+                # the whole transaction must be retried, see confirm_orders_in_batch
+                raise
+            _logger.info("Batch confirmation of %s orders failed, confirming them one by one",
+                         len(self), exc_info=True)
+        except Exception:
+            _logger.info("Batch confirmation of %s orders failed, confirming them one by one",
+                         len(self), exc_info=True)
+
+        confirmed = self.browse()
+        failed = []
+        for order in self:
+            try:
+                with self.env.cr.savepoint():
+                    order.action_confirm()
+            except OperationalError as e:
+                if e.pgcode in PG_CONCURRENCY_ERRORS_TO_RETRY:
+                    raise
+                _logger.warning("Could not confirm order %s: %s", order.name, e)
+                failed.append({'id': order.id, 'name': order.name, 'error': str(e)})
+                continue
+            except Exception as e:
+                _logger.warning("Could not confirm order %s: %s", order.name, e)
+                failed.append({'id': order.id, 'name': order.name, 'error': str(e)})
+                continue
+            confirmed |= order
+        return confirmed, failed
+
+    @api.model
+    def confirm_orders_in_parallel(self, order_ids, workers=None, chunk_size=None):
+        """
+        Confirm a backlog of orders in several processes.
+
+        The orders are partitioned so that orders sharing a product are
+        confirmed by the same worker (see tools.partition), which keeps the
+        workers off each other's quants and ledger locks. Each partition
+        becomes a confirmation job, confirmed by one of the confirmation crons
+        (each in its own cron worker process, within the limits of
+        --max-cron-threads) with confirm_orders_in_batch: chunks, per-order
+        failure isolation, bounded retries on concurrency errors. The call
+        returns once the jobs are queued; the report of the confirmation is
+        read with get_parallel_confirmation_report.
+
+        Meant to be called over XML-RPC/JSON-RPC, on orders already committed::
+
+            batch = models.execute_kw(db, uid, pwd, 'sale.order', 'confirm_orders_in_parallel', [order_ids])
+            models.execute_kw(db, uid, pwd, 'sale.order', 'get_parallel_confirmation_report', [batch['batch']])
+
+        :param order_ids: list of sale.order ids; orders that are not draft/sent are ignored
+        :param workers: number of partitions, defaults to the
+                 'multi_warehouse_sourcing_base.parallel_confirm_workers' parameter (4)
+        :param chunk_size: see confirm_orders_in_batch
+        :return: dict {'batch': batch reference, 'jobs': ids of the confirmation jobs}
+        """
+        if not workers:
+            workers = int(self.env['ir.config_parameter'].sudo().get_param(
+                'multi_warehouse_sourcing_base.parallel_confirm_workers', 4))
+        orders = self.browse(order_ids).exists().filtered(lambda o: o.state in ('draft', 'sent'))
+        partitions = orders._partition_for_parallel_confirmation(workers)
+        batch_reference = 'confirm-%s' % uuid.uuid4().hex
+        jobs = self.env['multi.warehouse.sourcing.job']._enqueue_confirmation(
+            partitions, batch_reference, chunk_size=chunk_size)
+        _logger.info("Parallel confirmation %s: %s orders queued in %s partitions",
+                     batch_reference, len(orders), len(partitions))
+        return {'batch': batch_reference, 'jobs': jobs.ids}
+
+    @api.model
+    def get_parallel_confirmation_report(self, batch_reference):
+        """
+        Report of a parallel confirmation, from the reports of its jobs.
+
+        :param batch_reference: reference returned by confirm_orders_in_parallel
+        :return: dict with the state of the batch ('running' until all its jobs
+                 are done or failed), the confirmed and failed orders, the number
+                 of retries, the report of each partition, the elapsed time and
+                 the throughput (orders per second)
+        """
+        jobs = self.env['multi.warehouse.sourcing.job'].sudo().search([
+            ('job_type', '=', 'confirmation'),
+            ('batch_reference', '=', batch_reference),
+        ])
+        reports = []
+        for job in jobs:
+            report = job.report or {'confirmed': [], 'failed': [], 'retries': 0, 'duration': 0.0}
+            if job.state == 'failed':
+                report = dict(report, failed=report['failed'] + [
+                    {'id': order.id, 'name': order.name, 'error': job.last_error}
+                    for order in job.order_ids
+                    if order.state in ('draft', 'sent')
+                ])
+            reports.append((job, report))
+        running = any(job.state in ('pending', 'running') for job in jobs)
+        duration = (max(jobs.mapped('write_date')) - min(jobs.mapped('create_date'))).total_seconds() if jobs else 0.0
+        result = {
+            'state': 'running' if running else 'done',
+            'confirmed': [order_id for _job, report in reports for order_id in report['confirmed']],
+            'failed': [failure for _job, report in reports for failure in report['failed']],
+            'retries': sum(report['retries'] for _job, report in reports),
+            'partitions': [{
+                'job': job.id,
+                'state': job.state,
+                'orders': len(job.order_ids),
+                'confirmed': len(report['confirmed']),
+                'failed': len(report['failed']),
+                'retries': report['retries'],
+                'duration': report['duration'],
+            } for job, report in reports],
+            'duration': duration,
+        }
+        result['throughput'] = len(result['confirmed']) / duration if duration and not running else 0.0
+        return result
+
+    def _partition_for_parallel_confirmation(self, partition_count):
+        """
+        Split these orders in at most partition_count lists of ids with disjoint
+        product footprints where possible, each order going with the product of
+        its largest line when a group of dependent orders must be split.
+        """
+        footprints = {}
+        dominant_products = {}
+        for order in self:
+            lines = order.order_line.filtered(lambda l: l.product_id.type == 'product')
+            footprints[order.id] = set(lines.product_id.ids)
+            quantities = Counter()
+            for line in lines:
+                quantities[line.product_id.id] += line.product_uom_qty
+            if quantities:
+                dominant_products[order.id] = quantities.most_common(1)[0][0]
+        return partition_by_footprint(footprints, partition_count, dominant_products)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from odoo import models
+
+
+class SaleOrderLine(models.Model):
+    _inherit = 'sale.order.line'
+
+    def _action_launch_stock_rule(self, previous_product_uom_qty=False):
+        """
+        Source the multi-warehouse lines through the sourcing service, in one
+        pass for all lines, before the standard rules run for the others.
+        """
+        configs = {
+            line: line._get_multi_warehouse_sourcing_config()
+            for line in self.filtered(lambda l: l.product_id.type == 'product')
+        }
+        lines = self.filtered(lambda l: configs.get(l))
+        if not lines:
+            return super()._action_launch_stock_rule(previous_product_uom_qty)
+
+        # Background sourcing: only queue the lines, the job launches them again
+        deferred_lines = lines.filtered(lambda l: l.order_id._is_multi_warehouse_sourcing_async())
+        if deferred_lines:
+            deferred_lines.order_id._enqueue_multi_warehouse_sourcing(deferred_lines)
+            lines -= deferred_lines
+
+        with self.env['multi.warehouse.sourcing.stat']._measure('launch_stock_rule') as measure:
+            measure['rows'] = len(lines)
+            self.env['multi.warehouse.sourcing']._source_lines(lines)
+
+        # Lines whose final delivery still follows the standard rules (e.g. from a collection warehouse)
+        standard_lines = (self - lines - deferred_lines) | lines.filtered(lambda l: configs[l]['standard_rule'])
+        if standard_lines:
+            super(SaleOrderLine, standard_lines)._action_launch_stock_rule(previous_product_uom_qty)
+        return True
+
+    def _get_multi_warehouse_sourcing_config(self):
+        """
+        How this line is sourced by the multi-warehouse sourcing service.
+        Overridden by the sourcing modules, each one contributing its settings.
+
+        :return: False when the line follows the standard procurement, else a dict with
+            - 'mode': name of the service method creating the moves (``_apply_<mode>``)
+            - 'warehouse_ids': ids of the warehouses the line may be sourced from
+            - 'destination_warehouse_id': id of the warehouse collecting the goods, if any
+            - 'standard_rule': whether the standard rules still run for the line (the
+              delivery from the destination warehouse), after the source moves
+        """
+        self.ensure_one()
+        return False
+
+    def _source_multi_warehouse_shortfall(self, quantities):
+        """
+        Source the quantities that were missing when these lines were sourced,
+        now that stock may have appeared.
+
+        :param quantities: dict {sale.order.line: missing qty}
+        :return: dict {sale.order.line: qty sourced}
+        """
+        Sourcing = self.env['multi.warehouse.sourcing']
+        return dict(Sourcing._get_move_quantities(Sourcing._source(quantities)))
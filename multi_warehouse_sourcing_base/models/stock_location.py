@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+# Fields of locations the cached sourcing topology depends on (transit location lookup)
+TOPOLOGY_FIELDS = {'usage', 'company_id', 'active'}
+
+
+class StockLocation(models.Model):
+    _inherit = 'stock.location'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        locations = super().create(vals_list)
+        if any(location.usage == 'transit' for location in locations):
+            self.env['stock.warehouse']._invalidate_sourcing_topology()
+        return locations
+
+    def write(self, vals):
+        res = super().write(vals)
+        if TOPOLOGY_FIELDS.intersection(vals):
+            self.env['stock.warehouse']._invalidate_sourcing_topology()
+        if 'location_id' in vals:
+            # quants may now belong to another warehouse
+            self.env['multi.warehouse.stock.summary']._rebuild_locations(self)
+        return res
+
+    def unlink(self):
+        invalidate = any(location.usage == 'transit' for location in self)
+        res = super().unlink()
+        if invalidate:
+            self.env['stock.warehouse']._invalidate_sourcing_topology()
+        return res
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+from odoo import api, fields, models
+
+
+class StockMove(models.Model):
+    _inherit = 'stock.move'
+
+    is_multi_warehouse_source_move = fields.Boolean(
+        string="Multi-Warehouse Source Move",
+        copy=False,
+        readonly=True,
+        help="Move created to source a sales order line from one of its source warehouses "
+             "(direct delivery or transfer to the collection warehouse).",
+    )
+    is_multi_warehouse_split_move = fields.Boolean(
+        string="Split from a Multi-Warehouse Source Move",
+        copy=False,
+        readonly=True,
+        help="Source move split from another one (e.g. a backorder), the remainder of a line already planned.",
+    )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        moves = super().create(vals_list)
+        self.env['multi.warehouse.capacity.counter']._count_moves(
+            moves.filtered('is_multi_warehouse_source_move'), 'planned')
+        return moves
+
+    def write(self, vals):
+        if 'product_uom_qty' not in vals:
+            return super().write(vals)
+        # resizing an open source move changes the work planned on its warehouse
+        moves = self._get_open_source_moves()
+        old_quantities = {move: move.product_qty for move in moves}
+        res = super().write(vals)
+        self.env['multi.warehouse.capacity.counter']._count_moves(moves, 'planned', quantities={
+            move: move.product_qty - old_quantities[move] for move in moves
+        })
+        return res
+
+    def _prepare_move_split_vals(self, qty):
+        vals = super()._prepare_move_split_vals(qty)
+        if self.is_multi_warehouse_source_move:
+            # the remainder still sources the line from the same warehouse
+            vals.update(is_multi_warehouse_source_move=True, is_multi_warehouse_split_move=True)
+        return vals
+
+    def _get_open_source_moves(self):
+        """ :return: the source moves still to be done """
+        return self.filtered(lambda m: m.is_multi_warehouse_source_move and m.state not in ('done', 'cancel'))
+
+    def _action_assign(self, force_qty=False):
+        res = super()._action_assign(force_qty=force_qty)
+        source_moves = self.filtered('is_multi_warehouse_source_move')
+        if source_moves:
+            self.env['multi.warehouse.allocation']._release_moves(source_moves)
+        return res
+
+    def _action_done(self, cancel_backorder=False):
+        source_moves = self._get_open_source_moves()
+        moves = super()._action_done(cancel_backorder=cancel_backorder)
+        self.env['multi.warehouse.capacity.counter']._count_moves(
+            source_moves.filtered(lambda m: m.state == 'done'), 'done')
+        if source_moves:
+            self.env['multi.warehouse.allocation']._release_moves(source_moves)
+        self.env['multi.warehouse.shortfall']._mark_products_dirty(moves.product_id.ids)
+        return moves
+
+    def _action_cancel(self):
+        source_moves = self._get_open_source_moves()
+        res = super()._action_cancel()
+        self.env['multi.warehouse.capacity.counter']._count_moves(
+            source_moves.filtered(lambda m: m.state == 'cancel'), 'cancelled')
+        if source_moves:
+            self.env['multi.warehouse.allocation']._release_moves(source_moves)
+        self.env['multi.warehouse.shortfall']._mark_products_dirty(self.product_id.ids)
+        return res
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+# Fields of picking types the cached sourcing topology depends on (internal type lookup)
+TOPOLOGY_FIELDS = {'code', 'warehouse_id', 'sequence', 'active', 'company_id'}
+
+
+class StockPickingType(models.Model):
+    _inherit = 'stock.picking.type'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        picking_types = super().create(vals_list)
+        if any(picking_type.code == 'internal' for picking_type in picking_types):
+            self.env['stock.warehouse']._invalidate_sourcing_topology()
+        return picking_types
+
+    def write(self, vals):
+        res = super().write(vals)
+        if TOPOLOGY_FIELDS.intersection(vals):
+            self.env['stock.warehouse']._invalidate_sourcing_topology()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['stock.warehouse']._invalidate_sourcing_topology()
+        return res
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+
+# Fields of quants the multi-warehouse stock summary depends on
+SUMMARY_FIELDS = {'quantity', 'reserved_quantity', 'product_id', 'location_id', 'lot_id'}
+
+
+class StockQuant(models.Model):
+    _inherit = 'stock.quant'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        quants = super().create(vals_list)
+        self.env['multi.warehouse.shortfall']._mark_products_dirty(quants.product_id.ids)
+        self.env['multi.warehouse.stock.summary']._add_deltas(quants._get_stock_summary_deltas())
+        return quants
+
+    def write(self, vals):
+        # the previous product/location/quantities are removed, the new ones added
+        deltas = self._get_stock_summary_deltas(sign=-1) if SUMMARY_FIELDS.intersection(vals) else None
+        res = super().write(vals)
+        if 'quantity' in vals or 'reserved_quantity' in vals:
+            self.env['multi.warehouse.shortfall']._mark_products_dirty(self.product_id.ids)
+        if deltas is not None:
+            self.env['multi.warehouse.stock.summary']._add_deltas(deltas + self._get_stock_summary_deltas())
+        return res
+
+    def unlink(self):
+        deltas = self._get_stock_summary_deltas(sign=-1)
+        res = super().unlink()
+        self.env['multi.warehouse.stock.summary']._add_deltas(deltas)
+        return res
+
+    def _get_stock_summary_deltas(self, sign=1):
+        """
+        :param sign: 1 to add the quants to the stock summary, -1 to remove them
+        :return: list of (product_id, location_id, lot_id, quantity, reserved_quantity)
+        """
+        return [
+            (quant.product_id.id, quant.location_id.id, quant.lot_id.id,
+             sign * quant.quantity, sign * quant.reserved_quantity)
+            for quant in self
+            if quant.location_id.usage == 'internal'
+        ]
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+from odoo import _, api, fields, models, tools
+from odoo.exceptions import UserError
+
+TRANSIT_LOCATION_NAME = 'Inter-Warehouse Transit'
+
+
+class StockWarehouse(models.Model):
+    _inherit = 'stock.warehouse'
+
+    sourcing_capacity_uom = fields.Selection([
+        ('lines', 'Lines'),
+        ('units', 'Units'),
+    ], string="Capacity Unit", default='lines', required=True,
+        help="Whether the daily capacity counts move lines to pick or product units.")
+    sourcing_daily_capacity = fields.Float(
+        string="Daily Picking Capacity",
+        help="Open outbound work (sourcing moves planned but not done yet) this warehouse can take. "
+             "Once reached, the warehouse is de-prioritized or skipped by multi-warehouse sourcing. "
+             "0 means unlimited.",
+    )
+
+    def init(self):
+        # Version of the sourcing topology, part of the key of the topology caches.
+        # It is set from a sequence so that a version is never reused, even when
+        # the transaction which took it is rolled back.
+        self.env.cr.execute("""
+            CREATE SEQUENCE IF NOT EXISTS multi_warehouse_topology_version_seq;
+            CREATE TABLE IF NOT EXISTS multi_warehouse_topology_version (
+                id integer PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+                version bigint NOT NULL DEFAULT nextval('multi_warehouse_topology_version_seq')
+            );
+            INSERT INTO multi_warehouse_topology_version (id) VALUES (1) ON CONFLICT DO NOTHING;
+        """)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        warehouses = super().create(vals_list)
+        self._invalidate_sourcing_topology()
+        return warehouses
+
+    def write(self, vals):
+        res = super().write(vals)
+        if self._get_sourcing_topology_fields().intersection(vals):
+            self._invalidate_sourcing_topology()
+        if 'lot_stock_id' in vals:
+            # quants may now belong to another warehouse
+            self.env['multi.warehouse.stock.summary']._rebuild_locations(self.lot_stock_id, self)
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self._invalidate_sourcing_topology()
+        return res
+
+    @api.model
+    def _get_sourcing_topology_fields(self):
+        """
+        Fields of warehouses the cached sourcing data depends on; writing one of
+        them invalidates the topology caches. Override to add module specific fields.
+
+        :return: set of field names
+        """
+        return {'active', 'company_id', 'lot_stock_id', 'out_type_id', 'int_type_id', 'view_location_id'}
+
+    @api.model
+    def _get_sourcing_topology_version(self):
+        """
+        Current version of the sourcing topology, read once per transaction.
+
+        The caches of the topology (and of other warehouse settings used by
+        sourcing) have this version in their key, so bumping it invalidates
+        them in every worker without clearing the rest of the registry cache.
+        """
+        data = self.env.cr.precommit.data
+        if 'multi_warehouse_topology_version' not in data:
+            self.env.cr.execute("SELECT version FROM multi_warehouse_topology_version")
+            data['multi_warehouse_topology_version'] = self.env.cr.fetchone()[0]
+        return data['multi_warehouse_topology_version']
+
+    @api.model
+    def _invalidate_sourcing_topology(self):
+        """ Bump the version of the sourcing topology, see _get_sourcing_topology_version. """
+        self.env.cr.execute("""
+            UPDATE multi_warehouse_topology_version
+               SET version = nextval('multi_warehouse_topology_version_seq')
+         RETURNING version
+        """)
+        self.env.cr.precommit.data['multi_warehouse_topology_version'] = self.env.cr.fetchone()[0]
+
+    def _sort_for_sourcing(self):
+        """
+        Order in which warehouses are preferred by the allocation engine when
+        several of them are equally good. Override to rank warehouses.
+
+        :return: sorted stock.warehouse recordset
+        """
+        return self.sorted('id')
+
+    def _get_saturated_warehouse_ids(self, loads=None):
+        """
+        Warehouses whose open outbound work reached their daily capacity.
+
+        :param loads: optional dict {warehouse_id: (open lines, open quantity)}, as
+                 returned by multi.warehouse.capacity.counter._get_open_loads; read
+                 from the counters when not given
+        :return: set of warehouse ids
+        """
+        warehouses = self.filtered('sourcing_daily_capacity')
+        if not warehouses:
+            return set()
+        if loads is None:
+            loads = self.env['multi.warehouse.capacity.counter'].sudo()._get_open_loads(warehouses.ids)
+        saturated_ids = set()
+        for warehouse in warehouses:
+            open_lines, open_quantity = loads.get(warehouse.id, (0, 0.0))
+            load = open_lines if warehouse.sourcing_capacity_uom == 'lines' else open_quantity
+            if load >= warehouse.sourcing_daily_capacity:
+                saturated_ids.add(warehouse.id)
+        return saturated_ids
+
+    def _prepare_sourcing_topology(self):
+        """
+        Resolve the records needed to source from or to this warehouse.
+        Override to add module specific entries; values must be ids (or False)
+        so they can be kept in the registry cache.
+
+        :return: dict of record ids
+        """
+        self.ensure_one()
+        int_type = self.env['stock.picking.type'].search([
+            ('code', '=', 'internal'),
+            ('warehouse_id', '=', self.id),
+        ], limit=1)
+        return {
+            'warehouse_id': self.id,
+            'lot_stock_id': self.lot_stock_id.id,
+            'int_type_id': int_type.id,
+            'out_type_id': self.out_type_id.id,
+        }
+
+    @api.model
+    @tools.ormcache('warehouse_id', 'self._get_sourcing_topology_version()')
+    def _get_sourcing_topology(self, warehouse_id):
+        """
+        Cached version of _prepare_sourcing_topology. The cache is invalidated
+        when a warehouse, picking type or location changes in a way that
+        affects the topology (see _invalidate_sourcing_topology).
+
+        :param warehouse_id: id of a stock.warehouse
+        :return: frozendict of record ids
+        """
+        warehouse = self.sudo().browse(warehouse_id)
+        return tools.frozendict(warehouse._prepare_sourcing_topology())
+
+    @api.model
+    def _get_sourcing_route_topology(self, source_warehouse_id, dest_warehouse_id):
+        """
+        Topology of a source -> destination warehouse pair, including the
+        transit location used between them.
+
+        :return: dict with 'source' and 'dest' topologies and 'transit_location_id'
+        """
+        source = self._get_sourcing_topology(source_warehouse_id)
+        return {
+            'source': source,
+            'dest': self._get_sourcing_topology(dest_warehouse_id),
+            'transit_location_id': self._get_transit_location(self.browse(source_warehouse_id).company_id.id).id,
+        }
+
+    @api.model
+    @tools.ormcache('company_id', 'self._get_sourcing_topology_version()')
+    def _get_transit_location_id(self, company_id):
+        """ Cached lookup of the inter-warehouse transit location, False if none exists. """
+        return self._search_transit_location_id(company_id)
+
+    @api.model
+    def _search_transit_location_id(self, company_id):
+        transit_location = self.env.ref('stock.stock_location_inter_wh', raise_if_not_found=False)
+        if not transit_location:
+            transit_location = self.env['stock.location'].sudo().search([
+                ('usage', '=', 'transit'),
+                ('company_id', 'in', [company_id, False]),
+            ], limit=1)
+        return transit_location.id
+
+    @api.model
+    def _get_transit_location(self, company_id):
+        """
+        Return the inter-warehouse transit location, creating it when missing.
+
+        Creation is serialized with a transaction-level advisory lock and the
+        location is searched again once the lock is held, so concurrent
+        confirmations never create duplicates.
+        """
+        StockLocation = self.env['stock.location'].sudo()
+        transit_location_id = self._get_transit_location_id(company_id)
+        if transit_location_id:
+            return StockLocation.browse(transit_location_id)
+
+        self.env.cr.execute("SELECT pg_advisory_xact_lock(hashtext(%s), %s)", [TRANSIT_LOCATION_NAME, company_id or 0])
+        # Another transaction may have created it while we were waiting for the lock
+        transit_location_id = self._search_transit_location_id(company_id)
+        if transit_location_id:
+            return StockLocation.browse(transit_location_id)
+        if not company_id:
+            raise UserError(_("No company is set to create the inter-warehouse transit location."))
+        return StockLocation.create({
+            'name': TRANSIT_LOCATION_NAME,
+            'usage': 'transit',
+            'company_id': company_id,
+        })
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+from . import test_allocation
+from . import test_capacity_counter
+from . import test_sourcing_log
+from . import test_stock_summary
+from . import test_tools
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+import logging
+import math
+import os
+import random
+import time
+
+from odoo.tests import TransactionCase
+
+_logger = logging.getLogger(__name__)
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name) or default)
+
+
+class MultiWarehouseBenchmarkCommon(TransactionCase):
+    """
+    Synthetic data generator and measurement helpers for the sourcing benchmarks.
+
+    The data set is made of N source warehouses, one distribution center,
+    M storable products whose stock is spread over a random subset of the
+    source warehouses, and K orders of L lines. Sizes default to the class
+    attributes and can be overridden from the environment to size hardware::
+
+        MW_BENCHMARK_WAREHOUSES=20 MW_BENCHMARK_ORDERS=200 odoo-bin --test-tags benchmark ...
+
+    The generator is seeded so two runs of the same size use the same data.
+
+    Query budgets are given per confirmed order and per line added to every
+    order. Each run logs the measured counts and the budgets they give with
+    budget_margin. A benchmark without calibrated budget (None) skips the
+    check and reports these budgets, to be committed on the benchmark; they
+    can also be set from the environment, e.g.::
+
+        MW_BENCHMARK_BUDGET_SCENARIO_A=150,12 odoo-bin --test-tags benchmark ...
+    """
+    n_warehouses = _env_int('MW_BENCHMARK_WAREHOUSES', 5)
+    n_products = _env_int('MW_BENCHMARK_PRODUCTS', 50)
+    n_orders = _env_int('MW_BENCHMARK_ORDERS', 10)
+    n_lines = _env_int('MW_BENCHMARK_LINES', 5)
+    seed = _env_int('MW_BENCHMARK_SEED', 42)
+    # Budgets calibrated from a run are the measured counts plus this margin
+    budget_margin = 1.1
+
+    # Models whose created records are reported
+    counted_models = ('stock.picking', 'stock.move', 'procurement.group', 'multi.warehouse.allocation')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.rng = random.Random(cls.seed)
+        cls.company = cls.env.company
+        cls.partner = cls.env['res.partner'].create({'name': 'Benchmark Customer'})
+        cls.warehouses = cls._create_warehouses(cls.n_warehouses)
+        cls.distribution_center = cls._create_warehouses(1, prefix='BDC')
+        cls.products = cls._create_products(cls.n_products)
+        cls._create_quants(cls.products, cls.warehouses)
+
+    @classmethod
+    def _create_warehouses(cls, count, prefix='BW'):
+        return cls.env['stock.warehouse'].create([{
+            'name': 'Benchmark %s %s' % (prefix, index),
+            'code': ('%s%s' % (prefix, index))[:5],
+            'company_id': cls.company.id,
+        } for index in range(count)])
+
+    @classmethod
+    def _create_products(cls, count):
+        return cls.env['product.product'].create([{
+            'name': 'Benchmark Product %s' % index,
+            'type': 'product',
+            'list_price': 10.0,
+        } for index in range(count)])
+
+    @classmethod
+    def _create_quants(cls, products, warehouses, min_qty=5, max_qty=50):
+        """ Put stock of each product in a random, non-empty subset of the warehouses. """
+        quant_vals_list = []
+        for product in products:
+            stocked = cls.rng.sample(warehouses.ids, cls.rng.randint(1, len(warehouses)))
+            for warehouse in warehouses.filtered(lambda w: w.id in stocked):
+                quant_vals_list.append({
+                    'product_id': product.id,
+                    'location_id': warehouse.lot_stock_id.id,
+                    'quantity': cls.rng.randint(min_qty, max_qty),
+                })
+        return cls.env['stock.quant'].sudo().create(quant_vals_list)
+
+    def _prepare_order_vals(self, website, n_lines, line_vals=None):
+        """ Values of one order of n_lines lines on distinct random products. """
+        return {
+            'partner_id': self.partner.id,
+            'website_id': website.id if website else False,
+            'order_line': [(0, 0, dict(
+                line_vals or {},
+                product_id=product.id,
+                product_uom_qty=self.rng.randint(1, 10),
+            )) for product in self.rng.sample(list(self.products), n_lines)],
+        }
+
+    def _create_orders(self, website, n_orders=None, n_lines=None, order_vals=None, line_vals=None):
+        n_orders = self.n_orders if n_orders is None else n_orders
+        n_lines = self.n_lines if n_lines is None else n_lines
+        return self.env['sale.order'].create([
+            dict(self._prepare_order_vals(website, n_lines, line_vals), **(order_vals or {}))
+            for _index in range(n_orders)
+        ])
+
+    def _count_records(self):
+        return {model: self.env[model].sudo().search_count([]) for model in self.counted_models}
+
+    def _benchmark_confirmation(self, label, orders):
+        """
+        Confirm the orders one by one, as website checkouts do, and measure it.
+
+        :return: dict with the wall time, the query count and the number of
+                 records created per counted model
+        """
+        cr = self.env.cr
+        self.env.flush_all()
+        self.env.invalidate_all()
+        counts_before = self._count_records()
+        queries_before = cr.sql_log_count
+        start = time.perf_counter()
+        for order in orders:
+            order.action_confirm()
+        self.env.flush_all()
+        duration = time.perf_counter() - start
+        queries = cr.sql_log_count - queries_before
+        counts_after = self._count_records()
+
+        report = {
+            'label': label,
+            'orders': len(orders),
+            'lines': len(orders.order_line),
+            'time': duration,
+            'queries': queries,
+            'created': {model: counts_after[model] - counts_before[model] for model in self.counted_models},
+        }
+        _logger.info(
+            "Benchmark %s: %s orders, %s lines, %.3fs (%.1fms/order), %s queries (%.1f/order, %.1f/line), created %s",
+            label, report['orders'], report['lines'], duration,
+            duration * 1000 / (report['orders'] or 1), queries,
+            queries / (report['orders'] or 1), queries / (report['lines'] or 1),
+            ', '.join('%s %s' % (count, model) for model, count in report['created'].items()),
+        )
+        return report
+
+    @classmethod
+    def _get_query_budget(cls, name, default):
+        """
+        :param name: suffix of the MW_BENCHMARK_BUDGET_<name> environment variable
+        :param default: tuple (per order budget, per line budget), None when not calibrated
+        :return: the budgets of the environment variable ("per_order,per_line"), or the default
+        """
+        value = os.environ.get('MW_BENCHMARK_BUDGET_%s' % name)
+        if not value:
+            return default
+        per_order_budget, per_line_budget = value.split(',')
+        return float(per_order_budget), float(per_line_budget)
+
+    def _assert_query_budget(self, label, create_orders, budget):
+        """
+        Benchmark the confirmation of K orders of L lines, then of K orders of
+        2L lines, and check the query counts against the budgets.
+
+        The per-line budget is checked on the difference between both runs, so
+        it fails when a change adds queries for every line even if the total
+        remains below the per-order budget.
+
+        :param create_orders: callable(n_orders, n_lines) returning the draft orders to confirm
+        :param budget: tuple (per order budget, per line budget), or None to only
+            measure them: the check is then skipped
+        :return: the reports of both runs
+        """
+        # Warm the registry caches (topology, configuration) outside of the measure
+        create_orders(1, self.n_lines).action_confirm()
+
+        report = self._benchmark_confirmation(label, create_orders(self.n_orders, self.n_lines))
+        double_report = self._benchmark_confirmation(
+            '%s (x2 lines)' % label, create_orders(self.n_orders, 2 * self.n_lines))
+
+        added_lines = double_report['lines'] - report['lines']
+        per_line = (double_report['queries'] - report['queries']) / (added_lines or 1)
+        per_order = report['queries'] / (report['orders'] or 1)
+        calibrated_budget = (math.ceil(per_order * self.budget_margin), math.ceil(per_line * self.budget_margin))
+        _logger.info(
+            "Benchmark %s: %.1f queries per order, %.1f per added line (budget %s), calibrated budget %s",
+            label, per_order, per_line, budget, calibrated_budget,
+        )
+        if budget is None:
+            self.skipTest("%s: query budget not calibrated, measured %s" % (label, calibrated_budget))
+        per_order_budget, per_line_budget = budget
+        self.assertLessEqual(
+            report['queries'], per_order_budget * report['orders'],
+            "%s: %s queries for %s orders, budget is %s per order" % (
+                label, report['queries'], report['orders'], per_order_budget))
+        self.assertLessEqual(
+            per_line, per_line_budget,
+            "%s: %.1f queries per additional line, budget is %s" % (label, per_line, per_line_budget))
+        return report, double_report
+
+
+class MultiWarehouseStockCommon(TransactionCase):
+    """
+    Two warehouses, a storable product and a sales order line, to
+    check the stock side of the sourcing (ledger, summary, counters) without
+    any sourcing module installed.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env.company
+        cls.partner = cls.env['res.partner'].create({'name': 'Multi-Warehouse Customer'})
+        Warehouse = cls.env['stock.warehouse']
+        cls.warehouse_1 = Warehouse.create({'name': 'Stock 1', 'code': 'MWST1', 'company_id': cls.company.id})
+        cls.warehouse_2 = Warehouse.create({'name': 'Stock 2', 'code': 'MWST2', 'company_id': cls.company.id})
+        cls.product = cls.env['product.product'].create({'name': 'Multi-Warehouse Stock Product', 'type': 'product'})
+        cls.order = cls.env['sale.order'].create({
+            'partner_id': cls.partner.id,
+            'order_line': [(0, 0, {'product_id': cls.product.id, 'product_uom_qty': 6})],
+        })
+        cls.line = cls.order.order_line
+        cls.customer_location = cls.env.ref('stock.stock_location_customers')
+
+    @classmethod
+    def _set_stock(cls, warehouse, qty, location=None):
+        cls.env['stock.quant']._update_available_quantity(cls.product, location or warehouse.lot_stock_id, qty)
+
+    def _create_source_move(self, warehouse, qty, source=True):
+        """ :return: a confirmed delivery of the sales order line from the warehouse """
+        move = self.env['stock.move'].create({
+            'name': self.product.name,
+            'product_id': self.product.id,
+            'product_uom_qty': qty,
+            'product_uom': self.product.uom_id.id,
+            'location_id': warehouse.lot_stock_id.id,
+            'location_dest_id': self.customer_location.id,
+            'picking_type_id': warehouse.out_type_id.id,
+            'sale_line_id': self.line.id,
+            'is_multi_warehouse_source_move': source,
+        })
+        move._action_confirm()
+        return move
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import MultiWarehouseStockCommon
+
+
+@tagged('post_install', '-at_install')
+class TestAllocation(MultiWarehouseStockCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Allocation = cls.env['multi.warehouse.allocation']
+
+    def _allocate(self, warehouse, qty):
+        return self.Allocation._allocate([(self.line, warehouse.id, qty)])
+
+    def test_open_allocations_are_deducted(self):
+        self._allocate(self.warehouse_1, 4)
+        self._allocate(self.warehouse_2, 1)
+        key_1, key_2 = (self.product.id, self.warehouse_1.id), (self.product.id, self.warehouse_2.id)
+        self.assertEqual(self.Allocation._get_open_quantities([self.product.id], self.warehouse_1.ids), {key_1: 4})
+        availability = self.Allocation._deduct_open_quantities({key_1: 10, key_2: 3})
+        self.assertEqual(availability, {key_1: 6, key_2: 2})
+        self.assertEqual(self.Allocation._lock_and_deduct({key_1: 10}), {key_1: 6})
+
+    def test_expired_and_released_allocations_are_ignored(self):
+        expired = self._allocate(self.warehouse_1, 4)
+        expired.expiration_date = fields.Datetime.now() - timedelta(minutes=1)
+        self._allocate(self.warehouse_1, 2).state = 'released'
+        self.assertEqual(self.Allocation._get_open_quantities([self.product.id], self.warehouse_1.ids), {})
+
+        self.Allocation._gc_allocations()
+        self.assertFalse(self.Allocation.search([('sale_line_id', '=', self.line.id)]))
+
+    def test_partially_available_move_releases_its_reservation(self):
+        allocation = self._allocate(self.warehouse_1, 6)
+        self._set_stock(self.warehouse_1, 2)
+        move = self._create_source_move(self.warehouse_1, 6)
+        move._action_assign()
+        self.assertEqual(move.state, 'partially_available')
+        self.assertEqual(allocation.state, 'open')
+        self.assertEqual(allocation.quantity, 4, "only the reserved quantity is released")
+
+        # assigning again releases nothing twice
+        move._action_assign()
+        self.assertEqual(allocation.quantity, 4)
+
+        self._set_stock(self.warehouse_1, 4)
+        move._action_assign()
+        self.assertEqual(move.state, 'assigned')
+        self.assertEqual(allocation.state, 'released')
+
+    def test_cancelled_move_releases_its_allocation(self):
+        allocation = self._allocate(self.warehouse_1, 6)
+        move = self._create_source_move(self.warehouse_1, 6)
+        move._action_cancel()
+        self.assertEqual(allocation.state, 'released')
+
+    def test_other_moves_do_not_release(self):
+        allocation = self._allocate(self.warehouse_1, 6)
+        self._set_stock(self.warehouse_1, 6)
+        move = self._create_source_move(self.warehouse_1, 6, source=False)
+        move._action_assign()
+        self.assertEqual(move.state, 'assigned')
+        self.assertEqual(allocation.state, 'open')
+        self.assertEqual(allocation.quantity, 6)
+
+    def test_allocations_of_other_warehouses_are_kept(self):
+        allocation_1 = self._allocate(self.warehouse_1, 3)
+        allocation_2 = self._allocate(self.warehouse_2, 3)
+        self._set_stock(self.warehouse_1, 3)
+        self._create_source_move(self.warehouse_1, 3)._action_assign()
+        self._create_source_move(self.warehouse_2, 3)._action_assign()
+        self.assertEqual(allocation_1.state, 'released')
+        self.assertEqual(allocation_2.state, 'open')
+        self.assertEqual(allocation_2.quantity, 3)
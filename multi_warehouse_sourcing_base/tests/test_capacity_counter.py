@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import MultiWarehouseStockCommon
+
+
+@tagged('post_install', '-at_install')
+class TestCapacityCounter(MultiWarehouseStockCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Counter = cls.env['multi.warehouse.capacity.counter']
+
+    def _get_load(self, warehouse):
+        return self.Counter._get_open_loads(warehouse.ids).get(warehouse.id, (0, 0.0))
+
+    def test_source_moves_are_counted(self):
+        move = self._create_source_move(self.warehouse_1, 6)
+        self._create_source_move(self.warehouse_2, 2)
+        self._create_source_move(self.warehouse_1, 5, source=False)
+        self.assertEqual(self._get_load(self.warehouse_1), (1, 6))
+        self.assertEqual(self._get_load(self.warehouse_2), (1, 2))
+
+        move.product_uom_qty = 4
+        self.assertEqual(self._get_load(self.warehouse_1), (1, 4))
+        move._action_cancel()
+        self.assertEqual(self._get_load(self.warehouse_1), (0, 0))
+
+    def test_increments_are_appended_and_compacted(self):
+        self._create_source_move(self.warehouse_1, 6)
+        self._create_source_move(self.warehouse_1, 3)
+        counters = self.Counter.search([('warehouse_id', '=', self.warehouse_1.id)])
+        self.assertEqual(len(counters), 2, "each transaction appends its own row")
+
+        self.Counter._compact()
+        counter = self.Counter.search([('warehouse_id', '=', self.warehouse_1.id)])
+        self.assertEqual(len(counter), 1)
+        self.assertEqual((counter.planned_lines, counter.planned_quantity), (2, 9))
+        self.assertEqual(self._get_load(self.warehouse_1), (2, 9))
+
+    def test_backorder_is_not_a_new_line(self):
+        self._set_stock(self.warehouse_1, 2)
+        move = self._create_source_move(self.warehouse_1, 6)
+        move._action_assign()
+        move.quantity = 2
+        move.picked = True
+        move._action_done()
+        backorder = self.env['stock.move'].search([
+            ('sale_line_id', '=', self.line.id), ('state', 'not in', ('done', 'cancel')),
+        ])
+        self.assertEqual(backorder.product_uom_qty, 4)
+        self.assertTrue(backorder.is_multi_warehouse_source_move)
+        self.assertTrue(backorder.is_multi_warehouse_split_move)
+        self.assertEqual(self._get_load(self.warehouse_1), (0, 4),
+                         "the line was picked once, its remainder only counts its quantity")
+
+        backorder._action_cancel()
+        self.assertEqual(self._get_load(self.warehouse_1), (0, 0))
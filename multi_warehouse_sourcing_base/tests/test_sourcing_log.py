@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import MultiWarehouseStockCommon
+from ..tools import SourcingDemand, plan_order
+
+
+@tagged('post_install', '-at_install')
+class TestSourcingLog(MultiWarehouseStockCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Log = cls.env['multi.warehouse.sourcing.log']
+
+    def _log_line(self, availability):
+        plan = plan_order([SourcingDemand(self.line.id, self.product.id, 6, None)],
+                          [self.warehouse_1.id, self.warehouse_2.id], dict(availability))
+        self.Log._log_plan(self.line, plan, availability, 'availability')
+        self.Log._flush_buffer()
+
+    def _get_logs(self):
+        return self.Log.search([('sale_line_id', '=', self.line.id)], order='warehouse_id, id')
+
+    def test_plan_is_logged_before_commit(self):
+        availability = {(self.product.id, self.warehouse_1.id): 4, (self.product.id, self.warehouse_2.id): 1}
+        plan = plan_order([SourcingDemand(self.line.id, self.product.id, 6, None)],
+                          [self.warehouse_1.id, self.warehouse_2.id], dict(availability))
+        self.Log._log_plan(self.line, plan, availability, 'availability')
+        self.assertFalse(self._get_logs(), "decisions are buffered until commit")
+        self.assertIn('multi_warehouse_sourcing_log', self.env.cr.precommit.data)
+
+        self.Log._flush_buffer()
+        logs = self._get_logs()
+        self.assertEqual(logs.warehouse_id, self.warehouse_1 | self.warehouse_2)
+        self.assertEqual(logs.mapped('quantity'), [4, 1])
+        self.assertEqual(logs.mapped('available_quantity'), [4, 1])
+        self.assertEqual(logs.mapped('shortfall'), [1, 1])
+        self.assertEqual(set(logs.mapped('strategy')), {'availability'})
+        self.assertEqual(logs.order_id, self.order)
+
+        # nothing is written twice
+        self.Log._flush_buffer()
+        self.assertEqual(len(self._get_logs()), 2)
+
+    def test_unsourced_line_is_logged(self):
+        self._log_line({})
+        log = self._get_logs()
+        self.assertEqual(len(log), 1)
+        self.assertFalse(log.warehouse_id)
+        self.assertEqual((log.quantity, log.shortfall), (0, 6))
+
+    def test_export(self):
+        self._log_line({(self.product.id, self.warehouse_1.id): 6})
+        date_from = fields.Datetime.now() - timedelta(hours=1)
+        date_to = fields.Datetime.now() + timedelta(hours=1)
+
+        rows = list(csv.reader(io.StringIO(''.join(self.Log._iter_export(date_from, date_to)))))
+        self.assertEqual(rows[0][:3], ['date', 'order_id', 'order_name'])
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][2], self.order.name)
+        self.assertEqual(rows[1][7], 'MWST1')
+
+        chunks = list(self.Log._iter_export(date_from, date_to, file_format='jsonl', batch_size=1))
+        self.assertEqual(len(chunks), 1)
+        row = json.loads(chunks[0])
+        self.assertEqual((row['sale_line_id'], row['warehouse_id'], row['quantity']),
+                         (self.line.id, self.warehouse_1.id, 6))
+
+        self.assertEqual(list(self.Log._iter_export(date_to, date_to + timedelta(hours=1), file_format='jsonl')), [])
+
+    def test_gc_logs(self):
+        self._log_line({(self.product.id, self.warehouse_1.id): 6})
+        self.env['ir.config_parameter'].sudo().set_param(
+            'multi_warehouse_sourcing_base.decision_log_retention_days', 1)
+        self.Log._gc_logs()
+        self.assertTrue(self._get_logs())
+
+        self.env.cr.execute("""
+            UPDATE multi_warehouse_sourcing_log SET date = date - interval '2 days' WHERE sale_line_id = %s
+        """, [self.line.id])
+        self.Log._gc_logs()
+        self.assertFalse(self._get_logs())
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import MultiWarehouseStockCommon
+
+
+@tagged('post_install', '-at_install')
+class TestStockSummary(MultiWarehouseStockCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Summary = cls.env['multi.warehouse.stock.summary']
+        cls.shelf = cls.env['stock.location'].create({
+            'name': 'Shelf',
+            'location_id': cls.warehouse_1.lot_stock_id.id,
+        })
+
+    def _get_available(self, warehouse):
+        return self.Summary._get_available_quantities(self.product, warehouse)[(self.product.id, warehouse.id)]
+
+    def _get_rows(self, table):
+        self.env.cr.execute("""
+            SELECT warehouse_id, lot_id, quantity, reserved_quantity
+              FROM %s
+             WHERE product_id = %%s
+          ORDER BY warehouse_id, lot_id, quantity, reserved_quantity
+        """ % table, [self.product.id])
+        return self.env.cr.fetchall()
+
+    def test_quant_changes_are_read_before_fold(self):
+        self._set_stock(self.warehouse_1, 10)
+        self._set_stock(self.warehouse_1, 5, location=self.shelf)
+        self.env['stock.quant']._update_reserved_quantity(self.product, self.warehouse_1.lot_stock_id, 3)
+        self.assertEqual(self._get_available(self.warehouse_1), 12)
+        self.assertEqual(self._get_available(self.warehouse_2), 0)
+
+    def test_read_does_not_write(self):
+        self._set_stock(self.warehouse_1, 10)
+        deltas = self._get_rows('multi_warehouse_stock_delta')
+        summary = self._get_rows('multi_warehouse_stock_summary')
+        self._get_available(self.warehouse_1)
+        self.assertEqual(self._get_rows('multi_warehouse_stock_delta'), deltas)
+        self.assertEqual(self._get_rows('multi_warehouse_stock_summary'), summary)
+
+    def test_fold(self):
+        self._set_stock(self.warehouse_1, 10)
+        self.env['stock.quant']._update_reserved_quantity(self.product, self.warehouse_1.lot_stock_id, 3)
+        self.Summary._fold_deltas()
+        self.assertFalse(self._get_rows('multi_warehouse_stock_delta'))
+        self.assertEqual(self._get_rows('multi_warehouse_stock_summary'), [(self.warehouse_1.id, None, 10, 3)])
+        self.assertEqual(self._get_available(self.warehouse_1), 7)
+
+        # rows without stock left are dropped
+        self.env['stock.quant']._update_reserved_quantity(self.product, self.warehouse_1.lot_stock_id, -3)
+        self._set_stock(self.warehouse_1, -10)
+        self.Summary._fold_deltas()
+        self.assertFalse(self._get_rows('multi_warehouse_stock_summary'))
+
+    def test_rebuild_matches_fold(self):
+        self._set_stock(self.warehouse_1, 10)
+        self._set_stock(self.warehouse_2, 4)
+        self.env['stock.quant']._update_reserved_quantity(self.product, self.warehouse_2.lot_stock_id, 1)
+        self.Summary._fold_deltas()
+        folded = self._get_rows('multi_warehouse_stock_summary')
+
+        self._set_stock(self.warehouse_1, 2)
+        self.Summary._rebuild([self.product.id])
+        self.assertFalse(self._get_rows('multi_warehouse_stock_delta'), "deltas are part of the rebuild")
+        self.assertEqual(self._get_rows('multi_warehouse_stock_summary'), [
+            (self.warehouse_1.id, None, 12, 0), (self.warehouse_2.id, None, 4, 1),
+        ])
+        self._set_stock(self.warehouse_1, -2)
+        self.Summary._fold_deltas()
+        self.assertEqual(self._get_rows('multi_warehouse_stock_summary'), folded)
+
+    def test_location_moved_to_another_warehouse(self):
+        self._set_stock(self.warehouse_1, 5, location=self.shelf)
+        self.shelf.location_id = self.warehouse_2.lot_stock_id
+        self.assertEqual(self._get_available(self.warehouse_1), 0)
+        self.assertEqual(self._get_available(self.warehouse_2), 5)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase
+
+from ..tools import (
+    DistanceIndex, SourcingDemand, SourcingPlan, SourcingStrategy, fill_in_order, get_strategy, haversine_km,
+    partition_by_footprint, plan_order, plan_orders,
+)
+from ..tools.allocation import _plan_order_python
+
+WH_1, WH_2, WH_3 = 1, 2, 3
+PRODUCT_A, PRODUCT_B = 10, 20
+
+
+@tagged('post_install', '-at_install')
+class TestAllocation(BaseCase):
+
+    def test_single_warehouse_preferred_to_split(self):
+        # WH_1 has the most of product A, but only WH_3 ships the whole order at once
+        availability = {
+            (PRODUCT_A, WH_1): 10, (PRODUCT_A, WH_3): 5,
+            (PRODUCT_B, WH_2): 5, (PRODUCT_B, WH_3): 5,
+        }
+        demands = [SourcingDemand('a', PRODUCT_A, 5, None), SourcingDemand('b', PRODUCT_B, 5, None)]
+        plan = plan_order(demands, [WH_1, WH_2, WH_3], availability)
+        self.assertEqual(plan.warehouse_ids, [WH_3])
+        self.assertEqual(plan.get_allocation('a'), {WH_3: 5})
+        self.assertEqual(plan.get_allocation('b'), {WH_3: 5})
+        self.assertEqual(availability[(PRODUCT_A, WH_3)], 0)
+        self.assertEqual(availability[(PRODUCT_A, WH_1)], 10)
+
+    def test_ties_go_to_the_first_warehouse(self):
+        availability = {(PRODUCT_A, WH_1): 5, (PRODUCT_A, WH_2): 5}
+        plan = plan_order([SourcingDemand('a', PRODUCT_A, 5, None)], [WH_2, WH_1], availability)
+        self.assertEqual(plan.get_allocation('a'), {WH_2: 5})
+
+    def test_split_and_shortfall(self):
+        availability = {(PRODUCT_A, WH_1): 4, (PRODUCT_A, WH_2): 3}
+        plan = plan_order([SourcingDemand('a', PRODUCT_A, 10, None)], [WH_1, WH_2], availability)
+        self.assertEqual(plan.get_allocation('a'), {WH_1: 4, WH_2: 3})
+        self.assertEqual(plan.get_shortfall('a'), 3)
+        self.assertEqual(plan.shipment_count, 2)
+
+    def test_allowed_warehouses(self):
+        availability = {(PRODUCT_A, WH_1): 10, (PRODUCT_A, WH_2): 10}
+        plan = plan_order([SourcingDemand('a', PRODUCT_A, 5, [WH_2])], [WH_1, WH_2], availability)
+        self.assertEqual(plan.get_allocation('a'), {WH_2: 5})
+
+    def test_python_fallback_matches(self):
+        availability = {
+            (PRODUCT_A, WH_1): 3, (PRODUCT_A, WH_2): 6, (PRODUCT_A, WH_3): 2,
+            (PRODUCT_B, WH_1): 4, (PRODUCT_B, WH_3): 1,
+        }
+        demands = [
+            SourcingDemand('a1', PRODUCT_A, 4, None),
+            SourcingDemand('a2', PRODUCT_A, 5, [WH_1, WH_3]),
+            SourcingDemand('b', PRODUCT_B, 6, None),
+        ]
+        plan = plan_order(demands, [WH_1, WH_2, WH_3], dict(availability))
+        python_plan = _plan_order_python(demands, [WH_1, WH_2, WH_3], dict(availability))
+        self.assertEqual(plan.to_dict(), python_plan.to_dict())
+
+    def test_plan_orders_share_availability(self):
+        availability = {(PRODUCT_A, WH_1): 5}
+        plans = plan_orders([
+            ('order_1', [SourcingDemand('a1', PRODUCT_A, 4, None)]),
+            ('order_2', [SourcingDemand('a2', PRODUCT_A, 4, None)]),
+        ], [WH_1], availability)
+        self.assertEqual(plans['order_1'].get_allocation('a1'), {WH_1: 4})
+        self.assertEqual(plans['order_2'].get_allocation('a2'), {WH_1: 1})
+        self.assertEqual(plans['order_2'].get_shortfall('a2'), 3)
+
+    def test_fill_in_order(self):
+        # sequential fill uses the first warehouse even if another covers everything
+        availability = {(PRODUCT_A, WH_1): 2, (PRODUCT_A, WH_2): 10}
+        plan = fill_in_order([SourcingDemand('a', PRODUCT_A, 5, None)], [WH_1, WH_2], availability)
+        self.assertEqual(plan.get_allocation('a'), {WH_1: 2, WH_2: 3})
+        self.assertEqual(availability, {(PRODUCT_A, WH_1): 0, (PRODUCT_A, WH_2): 7})
+
+    def test_plan_round_trip(self):
+        plan = plan_order([SourcingDemand(7, PRODUCT_A, 5, None)], [WH_1, WH_2],
+                          {(PRODUCT_A, WH_1): 2, (PRODUCT_A, WH_2): 2})
+        restored = SourcingPlan.from_dict(plan.to_dict())
+        self.assertEqual(restored.to_dict(), plan.to_dict())
+        self.assertEqual(restored.get_shortfall(7), 1)
+
+
+@tagged('post_install', '-at_install')
+class TestPartition(BaseCase):
+
+    def test_disjoint_footprints_are_spread(self):
+        partitions = partition_by_footprint({1: [PRODUCT_A], 2: [PRODUCT_B], 3: [30], 4: [40]}, 2)
+        self.assertEqual(sorted(map(len, partitions)), [2, 2])
+
+    def test_shared_products_stay_together(self):
+        partitions = partition_by_footprint({1: [PRODUCT_A], 2: [PRODUCT_B], 3: [PRODUCT_A, 30]}, 2)
+        self.assertIn([1, 3], partitions)
+        self.assertIn([2], partitions)
+
+    def test_large_component_split_by_dominant_key(self):
+        footprints = {1: [PRODUCT_A, PRODUCT_B], 2: [PRODUCT_A], 3: [PRODUCT_B], 4: [PRODUCT_B]}
+        dominant_keys = {1: PRODUCT_A, 2: PRODUCT_A, 3: PRODUCT_B, 4: PRODUCT_B}
+        self.assertEqual(len(partition_by_footprint(footprints, 2)), 1)
+        partitions = partition_by_footprint(footprints, 2, dominant_keys)
+        self.assertEqual(sorted(partitions), [[1, 2], [3, 4]])
+
+    def test_processing_order_and_empty_footprints(self):
+        partitions = partition_by_footprint({3: [], 1: [PRODUCT_A], 2: [PRODUCT_A]}, 1)
+        self.assertEqual(partitions, [[3, 1, 2]])
+        self.assertEqual(partition_by_footprint({}, 4), [])
+
+
+@tagged('post_install', '-at_install')
+class TestGeo(BaseCase):
+
+    def test_haversine(self):
+        # Paris - London
+        self.assertAlmostEqual(haversine_km(48.8566, 2.3522, 51.5074, -0.1278), 343.5, delta=1)
+        self.assertEqual(haversine_km(10.0, 20.0, 10.0, 20.0), 0.0)
+
+    def test_distance_index(self):
+        index = DistanceIndex([(WH_1, 48.8566, 2.3522), (WH_2, 51.5074, -0.1278)])
+        self.assertEqual(index.rank(50.8503, 4.3517), [WH_1, WH_2])  # Brussels
+        self.assertEqual(list(index.distances(50.8503, 4.3517, keys=[WH_2])), [WH_2])
+
+        # Paris moves to Madrid, London is removed, Berlin is added
+        changes = index.sync([(WH_1, 40.4168, -3.7038), (WH_3, 52.52, 13.405)], snapshot=2)
+        self.assertEqual(changes, 3)
+        self.assertEqual(index.snapshot, 2)
+        self.assertEqual(index.rank(50.8503, 4.3517), [WH_3, WH_1])
+        self.assertEqual(index.sync([(WH_1, 40.4168, -3.7038), (WH_3, 52.52, 13.405)]), 0)
+
+
+@tagged('post_install', '-at_install')
+class TestStrategies(BaseCase):
+
+    def test_get_strategy(self):
+        self.assertEqual(get_strategy('priority').code, 'priority')
+        self.assertEqual(get_strategy(False).code, 'availability')
+        self.assertEqual(get_strategy('unknown').code, 'availability')
+        with self.assertRaises(TypeError):
+            SourcingStrategy()
+
+    def test_priority_and_availability(self):
+        demands = [SourcingDemand('a', PRODUCT_A, 5, None)]
+        availability = {(PRODUCT_A, WH_1): 2, (PRODUCT_A, WH_2): 5}
+        priority_plan = get_strategy('priority').plan(demands, [WH_1, WH_2], dict(availability))
+        self.assertEqual(priority_plan.get_allocation('a'), {WH_1: 2, WH_2: 3})
+        availability_plan = get_strategy('availability').plan(demands, [WH_1, WH_2], dict(availability))
+        self.assertEqual(availability_plan.get_allocation('a'), {WH_2: 5})
+
+    def test_distance(self):
+        strategy = get_strategy('distance')
+        self.assertTrue(strategy.needs_distances)
+        demands = [SourcingDemand('a', PRODUCT_A, 5, None)]
+        availability = {(PRODUCT_A, WH_1): 5, (PRODUCT_A, WH_2): 5, (PRODUCT_A, WH_3): 5}
+        plan = strategy.plan(demands, [WH_1, WH_2, WH_3], availability, distances={WH_2: 10.0, WH_3: 5.0})
+        self.assertEqual(plan.get_allocation('a'), {WH_3: 5})
+        # warehouses without distance come last
+        plan = strategy.plan(demands, [WH_1, WH_2], {(PRODUCT_A, WH_1): 5, (PRODUCT_A, WH_2): 2},
+                             distances={WH_2: 10.0})
+        self.assertEqual(plan.get_allocation('a'), {WH_2: 2, WH_1: 3})
@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+from .allocation import SourcingDemand, SourcingPlan, fill_in_order, plan_order, plan_orders
+from .strategies import SourcingStrategy, get_strategy, register_strategy
+from .geo import DistanceIndex, haversine_km
+from .partition import partition_by_footprint
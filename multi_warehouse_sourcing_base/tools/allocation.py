@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Order-level allocation engine.
+
+Given the demand of a whole order and the availability of every product in
+every candidate warehouse, pick the source warehouses so that the number of
+warehouses (i.e. shipments) is minimal. The problem is a set cover with
+quantities; it is solved greedily: at each step the warehouse able to cover
+the largest remaining quantity is selected, ties going to the warehouse that
+comes first in the given priority order. A warehouse covering the whole
+order is therefore always preferred to a split.
+
+The engine is pure Python data in, pure Python data out so it can be used
+from any model (and outside of a transaction). NumPy is used when it is
+installed to vectorize the coverage computation, with an equivalent pure
+Python fallback.
+"""
+from collections import defaultdict, namedtuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+EPSILON = 1e-9
+
+# key: any hashable identifying the demand (usually a sale.order.line id)
+# warehouse_ids: warehouses allowed for this demand, None for all of them
+SourcingDemand = namedtuple('SourcingDemand', ['key', 'product_id', 'qty', 'warehouse_ids'])
+
+
+class SourcingPlan(object):
+    """ Result of the allocation of one order. """
+
+    __slots__ = ('allocations', 'shortfalls', 'warehouse_ids')
+
+    def __init__(self):
+        # {demand key: {warehouse_id: qty}}
+        self.allocations = defaultdict(dict)
+        # {demand key: qty that could not be allocated}
+        self.shortfalls = {}
+        # warehouses used by the plan, in selection order
+        self.warehouse_ids = []
+
+    @property
+    def shipment_count(self):
+        return len(self.warehouse_ids)
+
+    def get_allocation(self, key):
+        """ :return: dict {warehouse_id: qty} for the given demand key """
+        return dict(self.allocations.get(key, {}))
+
+    def get_shortfall(self, key):
+        return self.shortfalls.get(key, 0.0)
+
+    def add(self, key, warehouse_id, qty):
+        allocation = self.allocations[key]
+        allocation[warehouse_id] = allocation.get(warehouse_id, 0.0) + qty
+        if warehouse_id not in self.warehouse_ids:
+            self.warehouse_ids.append(warehouse_id)
+
+    def to_dict(self):
+        """ Plain (JSON serializable) representation of the plan. """
+        return {
+            'warehouse_ids': list(self.warehouse_ids),
+            'shipment_count': self.shipment_count,
+            'allocations': [
+                {'key': key, 'warehouse_id': warehouse_id, 'qty': qty}
+                for key, allocation in self.allocations.items()
+                for warehouse_id, qty in allocation.items()
+            ],
+            'shortfalls': [
+                {'key': key, 'qty': qty}
+                for key, qty in self.shortfalls.items()
+                if qty > EPSILON
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Rebuild a plan from its to_dict() representation (e.g. loaded from JSON). """
+        plan = cls()
+        plan.warehouse_ids = list(data['warehouse_ids'])
+        for allocation in data['allocations']:
+            plan.allocations[allocation['key']][allocation['warehouse_id']] = allocation['qty']
+        for shortfall in data['shortfalls']:
+            plan.shortfalls[shortfall['key']] = shortfall['qty']
+        return plan
+
+
+def plan_order(demands, warehouse_ids, availability):
+    """
+    Allocate the demands of one order while minimizing the number of source warehouses.
+
+    :param demands: list of SourcingDemand
+    :param warehouse_ids: candidate warehouse ids, by priority (first = preferred on ties)
+    :param availability: dict {(product_id, warehouse_id): available qty}. It is
+        updated in place with the quantities allocated, so that consecutive calls
+        share the same stock.
+    :return: SourcingPlan
+    """
+    demands = [demand for demand in demands if demand.qty > EPSILON]
+    warehouse_ids = list(dict.fromkeys(warehouse_ids))
+    if numpy is not None and demands and warehouse_ids:
+        return _plan_order_numpy(demands, warehouse_ids, availability)
+    return _plan_order_python(demands, warehouse_ids, availability)
+
+
+def fill_in_order(demands, warehouse_ids, availability):
+    """
+    Allocate each demand from the warehouses taken in the given order, without
+    trying to reduce the number of warehouses used (sequential fill).
+
+    Same parameters and return value as plan_order.
+    """
+    plan = SourcingPlan()
+    for demand in demands:
+        remaining = demand.qty
+        allowed = None if demand.warehouse_ids is None else set(demand.warehouse_ids)
+        for warehouse_id in dict.fromkeys(warehouse_ids):
+            if remaining <= EPSILON:
+                break
+            if allowed is not None and warehouse_id not in allowed:
+                continue
+            key = (demand.product_id, warehouse_id)
+            qty = min(remaining, availability.get(key, 0.0))
+            if qty <= EPSILON:
+                continue
+            plan.add(demand.key, warehouse_id, qty)
+            availability[key] = availability.get(key, 0.0) - qty
+            remaining -= qty
+        if remaining > EPSILON:
+            plan.shortfalls[demand.key] = remaining
+    return plan
+
+
+def plan_orders(orders_demands, warehouse_ids, availability):
+    """
+    Allocate several orders in sequence against a shared availability.
+
+    :param orders_demands: iterable of (order key, list of SourcingDemand)
+    :return: dict {order key: SourcingPlan}
+    """
+    return {
+        order_key: plan_order(demands, warehouse_ids, availability)
+        for order_key, demands in orders_demands
+    }
+
+
+def _plan_order_numpy(demands, warehouse_ids, availability):
+    plan = SourcingPlan()
+    product_ids = list(dict.fromkeys(demand.product_id for demand in demands))
+    product_index = {product_id: index for index, product_id in enumerate(product_ids)}
+    warehouse_index = {warehouse_id: index for index, warehouse_id in enumerate(warehouse_ids)}
+
+    line_product = numpy.array([product_index[demand.product_id] for demand in demands])
+    remaining = numpy.array([demand.qty for demand in demands], dtype=float)
+    allowed = numpy.zeros((len(demands), len(warehouse_ids)), dtype=bool)
+    for row, demand in enumerate(demands):
+        if demand.warehouse_ids is None:
+            allowed[row, :] = True
+        else:
+            for warehouse_id in demand.warehouse_ids:
+                if warehouse_id in warehouse_index:
+                    allowed[row, warehouse_index[warehouse_id]] = True
+    available = numpy.array([
+        [max(availability.get((product_id, warehouse_id), 0.0), 0.0) for warehouse_id in warehouse_ids]
+        for product_id in product_ids
+    ], dtype=float)
+    used = numpy.zeros(len(warehouse_ids), dtype=bool)
+    # lines grouped by product (stable, so lines keep their order within a product)
+    order = numpy.argsort(line_product, kind='stable')
+    sorted_product = line_product[order]
+    group_start = numpy.r_[True, sorted_product[1:] != sorted_product[:-1]]
+    group_id = numpy.cumsum(group_start) - 1
+
+    while remaining.sum() > EPSILON:
+        # remaining demand per product that each warehouse is allowed to serve (P x W)
+        demand_matrix = numpy.zeros_like(available)
+        numpy.add.at(demand_matrix, line_product, allowed * remaining[:, None])
+        coverage = numpy.minimum(demand_matrix, available).sum(axis=0)
+        coverage[used] = 0.0
+        # argmax returns the first maximum: ties go to the highest priority warehouse
+        column = int(numpy.argmax(coverage))
+        if coverage[column] <= EPSILON:
+            break
+        used[column] = True
+
+        # allocate the warehouse stock to the lines, in line order within each product
+        requested = numpy.where(allowed[:, column], remaining, 0.0)[order]
+        cumulated = numpy.cumsum(requested) - requested
+        before = cumulated - cumulated[group_start][group_id]
+        taken_sorted = numpy.clip(available[sorted_product, column] - before, 0.0, requested)
+        taken = numpy.empty_like(taken_sorted)
+        taken[order] = taken_sorted
+
+        remaining -= taken
+        available[:, column] -= numpy.bincount(line_product, weights=taken, minlength=len(product_ids))
+        warehouse_id = warehouse_ids[column]
+        for row in numpy.nonzero(taken > EPSILON)[0]:
+            demand = demands[row]
+            qty = float(taken[row])
+            plan.add(demand.key, warehouse_id, qty)
+            availability[(demand.product_id, warehouse_id)] = availability.get((demand.product_id, warehouse_id), 0.0) - qty
+
+    for row, demand in enumerate(demands):
+        if remaining[row] > EPSILON:
+            plan.shortfalls[demand.key] = plan.shortfalls.get(demand.key, 0.0) + float(remaining[row])
+    return plan
+
+
+def _plan_order_python(demands, warehouse_ids, availability):
+    plan = SourcingPlan()
+    remaining = [demand.qty for demand in demands]
+    allowed = [
+        set(warehouse_ids) if demand.warehouse_ids is None else set(demand.warehouse_ids) & set(warehouse_ids)
+        for demand in demands
+    ]
+    available = {
+        (demand.product_id, warehouse_id): max(availability.get((demand.product_id, warehouse_id), 0.0), 0.0)
+        for demand in demands
+        for warehouse_id in warehouse_ids
+    }
+    used = set()
+
+    while sum(remaining) > EPSILON:
+        best_warehouse_id, best_coverage = None, EPSILON
+        for warehouse_id in warehouse_ids:
+            if warehouse_id in used:
+                continue
+            demand_per_product = defaultdict(float)
+            for row, demand in enumerate(demands):
+                if warehouse_id in allowed[row]:
+                    demand_per_product[demand.product_id] += remaining[row]
+            coverage = sum(
+                min(qty, available[(product_id, warehouse_id)])
+                for product_id, qty in demand_per_product.items()
+            )
+            # strict comparison: ties go to the highest priority warehouse
+            if coverage > best_coverage:
+                best_warehouse_id, best_coverage = warehouse_id, coverage
+        if best_warehouse_id is None:
+            break
+        used.add(best_warehouse_id)
+
+        for row, demand in enumerate(demands):
+            if best_warehouse_id not in allowed[row] or remaining[row] <= EPSILON:
+                continue
+            key = (demand.product_id, best_warehouse_id)
+            qty = min(remaining[row], available[key])
+            if qty <= EPSILON:
+                continue
+            remaining[row] -= qty
+            available[key] -= qty
+            plan.add(demand.key, best_warehouse_id, qty)
+            availability[key] = availability.get(key, 0.0) - qty
+
+    for row, demand in enumerate(demands):
+        if remaining[row] > EPSILON:
+            plan.shortfalls[demand.key] = plan.shortfalls.get(demand.key, 0.0) + remaining[row]
+    return plan
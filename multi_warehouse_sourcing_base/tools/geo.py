@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Offline great-circle distance helpers.
+
+``DistanceIndex`` keeps the coordinates of a set of points (warehouses) in
+memory and ranks them by haversine distance to a given location. It can be
+kept up to date incrementally with ``sync``, which only touches the points
+that were added, moved or removed. Distances are vectorized with NumPy when
+it is installed, with a pure Python fallback.
+"""
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """ Great-circle distance in kilometers between two (latitude, longitude) points in degrees. """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class DistanceIndex(object):
+    """ In-memory coordinates of points, ranked by distance to a location. """
+
+    def __init__(self, points=()):
+        # {key: (latitude, longitude)} in degrees
+        self._points = {}
+        self._keys = []
+        self._radians = None
+        self.snapshot = None
+        for key, latitude, longitude in points:
+            self._points[key] = (latitude, longitude)
+
+    def __len__(self):
+        return len(self._points)
+
+    def sync(self, points, snapshot=None):
+        """
+        Apply the differences between the indexed points and ``points``.
+
+        :param points: iterable of (key, latitude, longitude), the full current set
+        :param snapshot: opaque marker of the data version, stored as ``self.snapshot``
+        :return: number of points added, moved or removed
+        """
+        current = {key: (latitude, longitude) for key, latitude, longitude in points}
+        changes = 0
+        for key in set(self._points) - set(current):
+            del self._points[key]
+            changes += 1
+        for key, coordinates in current.items():
+            if self._points.get(key) != coordinates:
+                self._points[key] = coordinates
+                changes += 1
+        if changes:
+            self._radians = None
+        self.snapshot = snapshot
+        return changes
+
+    def _get_arrays(self):
+        if self._radians is None:
+            self._keys = list(self._points)
+            coordinates = [self._points[key] for key in self._keys]
+            if numpy is not None:
+                self._radians = numpy.radians(numpy.array(coordinates, dtype=float).reshape(-1, 2))
+            else:
+                self._radians = [(math.radians(lat), math.radians(lon)) for lat, lon in coordinates]
+        return self._keys, self._radians
+
+    def distances(self, latitude, longitude, keys=None):
+        """
+        :param keys: optional iterable restricting the points considered
+        :return: dict {key: distance in km} for the indexed points
+        """
+        point_keys, radians = self._get_arrays()
+        if not point_keys:
+            return {}
+        phi, lam = math.radians(latitude), math.radians(longitude)
+        if numpy is not None:
+            d_phi = radians[:, 0] - phi
+            d_lambda = radians[:, 1] - lam
+            a = numpy.sin(d_phi / 2) ** 2 + math.cos(phi) * numpy.cos(radians[:, 0]) * numpy.sin(d_lambda / 2) ** 2
+            values = (2 * EARTH_RADIUS_KM * numpy.arcsin(numpy.minimum(1.0, numpy.sqrt(a)))).tolist()
+        else:
+            values = [
+                haversine_km(latitude, longitude, math.degrees(point_phi), math.degrees(point_lambda))
+                for point_phi, point_lambda in radians
+            ]
+        result = dict(zip(point_keys, values))
+        if keys is not None:
+            result = {key: result[key] for key in keys if key in result}
+        return result
+
+    def rank(self, latitude, longitude, keys=None):
+        """ :return: list of keys, nearest first """
+        distances = self.distances(latitude, longitude, keys)
+        return sorted(distances, key=distances.get)
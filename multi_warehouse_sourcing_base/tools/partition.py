@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Partitioning of orders for parallel confirmation.
+
+Two orders sharing a product compete for the same quants and ledger locks,
+so they are kept in the same partition: orders are grouped in connected
+components (union-find over their product footprints), then the components
+are packed in the requested number of partitions, largest first into the
+smallest partition. A component larger than a balanced share would prevent
+any parallelism; it is split by the dominant product of its orders, the
+remaining overlap being handled by the locks and retries of the workers.
+"""
+from collections import defaultdict
+
+
+class _UnionFind(object):
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, key):
+        self.parent.setdefault(key, key)
+        while self.parent[key] != key:
+            # path halving
+            self.parent[key] = self.parent[self.parent[key]]
+            key = self.parent[key]
+        return key
+
+    def union(self, key1, key2):
+        root1, root2 = self.find(key1), self.find(key2)
+        if root1 != root2:
+            self.parent[root2] = root1
+
+
+def partition_by_footprint(footprints, partition_count, dominant_keys=None):
+    """
+    :param footprints: dict {item: iterable of keys (e.g. product ids)}, in processing order
+    :param partition_count: maximal number of partitions
+    :param dominant_keys: optional dict {item: key} used to split the components
+        larger than a balanced share
+    :return: list of non-empty lists of items, items keep their processing order
+    """
+    if not footprints:
+        return []
+    partition_count = max(partition_count, 1)
+    union_find = _UnionFind()
+    for item, keys in footprints.items():
+        keys = list(keys)
+        for key in keys[1:]:
+            union_find.union(keys[0], key)
+
+    components = defaultdict(list)
+    for item, keys in footprints.items():
+        keys = list(keys)
+        # items without any key depend on nothing
+        root = union_find.find(keys[0]) if keys else ('item', item)
+        components[root].append(item)
+    groups = list(components.values())
+
+    share = -(-len(footprints) // partition_count)
+    if dominant_keys and partition_count > 1:
+        split_groups = []
+        for group in groups:
+            if len(group) <= share:
+                split_groups.append(group)
+                continue
+            by_dominant_key = defaultdict(list)
+            for item in group:
+                by_dominant_key[dominant_keys.get(item)].append(item)
+            split_groups += by_dominant_key.values()
+        groups = split_groups
+
+    partitions = [[] for _index in range(min(partition_count, len(groups)))]
+    for group in sorted(groups, key=len, reverse=True):
+        min(partitions, key=len).extend(group)
+    position = {item: index for index, item in enumerate(footprints)}
+    return [sorted(partition, key=position.get) for partition in partitions if partition]
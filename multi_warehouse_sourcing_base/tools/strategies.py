@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Pluggable sourcing strategies.
+
+A strategy turns the demand of one order into a SourcingPlan. It is
+instantiated once per order and only receives the inputs it declared, so
+the caller never computes data (e.g. customer distances) that the
+configured strategy does not use.
+
+New strategies are added with the ``register_strategy`` decorator::
+
+    @register_strategy
+    class MyStrategy(SourcingStrategy):
+        code = 'my_code'
+
+        def plan(self, demands, warehouse_ids, availability, distances=None):
+            ...
+"""
+from abc import ABC, abstractmethod
+
+from .allocation import fill_in_order, plan_order
+
+DEFAULT_STRATEGY = 'availability'
+
+_strategies = {}
+
+
+def register_strategy(strategy_class):
+    """ Class decorator adding a strategy to the registry, under its ``code``. """
+    _strategies[strategy_class.code] = strategy_class
+    return strategy_class
+
+
+def get_strategy(code):
+    """ :return: an instance of the strategy registered as ``code``, or of the default one """
+    return _strategies.get(code or DEFAULT_STRATEGY, _strategies[DEFAULT_STRATEGY])()
+
+
+class SourcingStrategy(ABC):
+    """ Base class of the sourcing strategies. """
+
+    code = None
+    # whether plan() needs the {warehouse_id: distance to the customer} mapping
+    needs_distances = False
+
+    @abstractmethod
+    def plan(self, demands, warehouse_ids, availability, distances=None):
+        """
+        :param demands: list of SourcingDemand of the order
+        :param warehouse_ids: candidate warehouse ids, by priority
+        :param availability: dict {(product_id, warehouse_id): qty}, consumed in place
+        :param distances: dict {warehouse_id: distance}, only given when needs_distances
+        :return: SourcingPlan
+        """
+
+
+@register_strategy
+class PriorityStrategy(SourcingStrategy):
+    """ Take each line from the highest priority warehouses first. """
+
+    code = 'priority'
+
+    def plan(self, demands, warehouse_ids, availability, distances=None):
+        return fill_in_order(demands, warehouse_ids, availability)
+
+
+@register_strategy
+class AvailabilityStrategy(SourcingStrategy):
+    """ Use the warehouses whose stock covers most of the order, minimizing shipments. """
+
+    code = 'availability'
+
+    def plan(self, demands, warehouse_ids, availability, distances=None):
+        return plan_order(demands, warehouse_ids, availability)
+
+
+@register_strategy
+class DistanceStrategy(SourcingStrategy):
+    """ Take each line from the warehouses closest to the customer first. """
+
+    code = 'distance'
+    needs_distances = True
+
+    def plan(self, demands, warehouse_ids, availability, distances=None):
+        distances = distances or {}
+        # Warehouses without a known distance come last, keeping their priority order
+        ranked_ids = sorted(
+            warehouse_ids,
+            key=lambda warehouse_id: (warehouse_id not in distances, distances.get(warehouse_id, 0.0)),
+        )
+        return fill_in_order(demands, ranked_ids, availability)
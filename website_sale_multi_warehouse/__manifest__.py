@@ -11,7 +11,7 @@
         - Final delivery to customer is done from the distribution center
         - Works only for online sales without affecting standard workflows
     """,
-    'depends': ['sale_stock', 'website_sale', 'stock', 'delivery'],
+    'depends': ['sale_stock', 'website_sale', 'stock', 'delivery', 'multi_warehouse_sourcing_base'],
     'data': [
         'security/ir.model.access.csv',
         'views/stock_warehouse_views.xml',
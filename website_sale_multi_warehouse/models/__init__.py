@@ -4,4 +4,6 @@ from . import sale_order
 from . import res_config_settings
 from . import procurement_group
 from . import stock_picking
-from . import website
\ No newline at end of file
+from . import res_partner
+from . import website
+from . import multi_warehouse_sourcing
\ No newline at end of file
@@ -0,0 +1,26 @@
+# models/multi_warehouse_sourcing.py
+from collections import defaultdict
+
+from odoo import models, api
+
+
+class MultiWarehouseSourcing(models.AbstractModel):
+    _inherit = 'multi.warehouse.sourcing'
+
+    @api.model
+    def _apply_transit(self, quantities, configs, plans):
+        """Transfer the planned quantities to the distribution centers through the transit location
+
+        :return: the outgoing (source) moves
+        """
+        Warehouse = self.env['stock.warehouse']
+        # Quantities to transfer, grouped per (order, source warehouse): {(order, warehouse): [(line, qty)]}
+        transfers = defaultdict(list)
+        for line in quantities:
+            for warehouse_id, qty in plans[line.order_id.id].get_allocation(line.id).items():
+                transfers[(line.order_id, Warehouse.browse(warehouse_id))].append((line, qty))
+
+        # One outgoing/incoming picking pair per order and source warehouse
+        pickings = self.env['sale.order']._create_warehouse_transfers(transfers)
+        out_pickings = self.env['stock.picking'].union(*(out for out, _in in pickings.values()))
+        return out_pickings.move_ids
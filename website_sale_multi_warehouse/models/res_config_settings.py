@@ -25,4 +25,14 @@ class ResConfigSettings(models.TransientModel):
         ('distance', 'Customer Distance')
     ], string="Warehouse Sourcing Method",
         config_parameter='website_sale_multi_warehouse.sourcing_method',
-        default='availability')
\ No newline at end of file
+        default='availability')
+
+    def set_values(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        params = [self._fields[name].config_parameter for name in (
+            'distribution_warehouse_id', 'enable_multi_warehouse_for_website', 'sourcing_method')]
+        previous_values = [ICP.get_param(param) for param in params]
+        super().set_values()
+        if [ICP.get_param(param) for param in params] != previous_values:
+            # Website._get_multi_warehouse_config is cached per sourcing topology version
+            self.env['stock.warehouse']._invalidate_sourcing_topology()
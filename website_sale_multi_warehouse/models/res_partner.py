@@ -0,0 +1,15 @@
+# models/res_partner.py
+from odoo import models
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if ('partner_latitude' in vals or 'partner_longitude' in vals) and \
+                self.env['stock.warehouse'].sudo().search_count([('partner_id', 'in', self.ids)], limit=1):
+            # The warehouse coordinates follow their address without going through
+            # stock.warehouse.write: invalidate the cached coordinates here
+            self.env['stock.warehouse']._invalidate_sourcing_topology()
+        return res
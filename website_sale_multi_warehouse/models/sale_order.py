@@ -1,6 +1,5 @@
 # models/sale_order.py
 from odoo import models, fields, api
-from collections import defaultdict
 
 
 class SaleOrder(models.Model):
@@ -25,11 +24,12 @@ class SaleOrder(models.Model):
         domain=[('is_distribution_center', '=', True)]
     )
 
+    # Not stored: it only depends on configuration, so it is evaluated when read
+    # (at confirmation) instead of being rewritten on every cart update
     sourcing_warehouse_ids = fields.Many2many(
         'stock.warehouse',
         string="Sourcing Warehouses",
         compute="_compute_sourcing_warehouses",
-        store=True
     )
 
     internal_transfer_ids = fields.One2many(
@@ -43,47 +43,44 @@ class SaleOrder(models.Model):
         result = super()._cart_update(product_id, line_id, add_qty, set_qty, **kwargs)
 
         if self.website_id:
+            config = self.website_id._get_multi_warehouse_config()
+            # Only write what actually changes, most cart updates leave the order untouched
+            vals = {}
+
             # Mark as website multi-warehouse order
-            ICP = self.env['ir.config_parameter'].sudo()
-            if ICP.get_param('website_sale_multi_warehouse.enable_multi_warehouse_for_website'):
-                self.is_website_multi_warehouse = True
+            if config['enabled'] and not self.is_website_multi_warehouse:
+                vals['is_website_multi_warehouse'] = True
 
             # Update distribution warehouse if needed and not already set
-            if not self.distribution_warehouse_id:
-                distribution_warehouse_id = int(ICP.get_param(
-                    'website_sale_multi_warehouse.default_distribution_warehouse_id', '0'))
-                if distribution_warehouse_id:
-                    self.distribution_warehouse_id = distribution_warehouse_id
+            if not self.distribution_warehouse_id and config['distribution_warehouse_id']:
+                vals['distribution_warehouse_id'] = config['distribution_warehouse_id']
+
+            if vals:
+                self.write(vals)
 
         return result
 
-    @api.depends('order_line.product_id', 'order_line.product_uom_qty', 'website_id')
+    @api.depends('website_id', 'company_id', 'distribution_warehouse_id')
     def _compute_sourcing_warehouses(self):
-        param = self.env['ir.config_parameter'].sudo()
-        enable_multi_warehouse = param.get_param('website_sale_multi_warehouse.enable_multi_warehouse_for_website',
-                                                 False)
+        Warehouse = self.env['stock.warehouse']
 
         for order in self:
-            warehouses = self.env['stock.warehouse']
-
             # Only apply for website orders if enabled
-            if not (order.website_id and enable_multi_warehouse):
-                order.sourcing_warehouse_ids = warehouses
+            if not (order.website_id and order.website_id._get_multi_warehouse_config()['enabled']):
+                order.sourcing_warehouse_ids = Warehouse
                 continue
 
-            # Find eligible warehouses (that are marked as eCommerce sources)
-            eligible_warehouses = self.env['stock.warehouse'].search([
-                ('is_ecommerce_source', '=', True),
-            ], order='ecommerce_priority asc')  # Order by priority (lowest first)
+            # Eligible warehouses (marked as eCommerce sources), ordered by priority, cached per company
+            eligible_warehouse_ids = Warehouse._get_ecommerce_source_warehouse_ids(order.company_id.id)
 
-            if eligible_warehouses:
-                order.sourcing_warehouse_ids = eligible_warehouses
+            if eligible_warehouse_ids:
+                order.sourcing_warehouse_ids = Warehouse.browse(eligible_warehouse_ids)
             elif order.distribution_warehouse_id:
                 order.sourcing_warehouse_ids = order.distribution_warehouse_id
             else:
                 # Fallback to default warehouse
-                default_warehouse = self.env['stock.warehouse'].search([], limit=1)
-                order.sourcing_warehouse_ids = default_warehouse
+                order.sourcing_warehouse_ids = Warehouse.browse(
+                    Warehouse._get_default_sourcing_warehouse_id(order.company_id.id))
 
     @api.depends('sourcing_warehouse_ids', 'is_website_multi_warehouse')
     def _compute_is_multi_warehouse(self):
@@ -91,152 +88,184 @@ class SaleOrder(models.Model):
             # Mark as multi-warehouse if multiple warehouses OR it's a flagged website order
             order.is_multi_warehouse = len(order.sourcing_warehouse_ids) > 1 or order.is_website_multi_warehouse
 
-    def _action_confirm(self):
-        res = super()._action_confirm()
-
-        # Only process if this is a multi-warehouse order
-        for order in self:
-            if not order.is_website_multi_warehouse or not order.distribution_warehouse_id:
-                continue
-
-            # For each order line
-            for line in order.order_line:
-                needed_qty = line.product_uom_qty
-                # Use the computed field, not the compute method
-                for warehouse in order.sourcing_warehouse_ids:
-                    available = self._get_available_qty(warehouse, line.product_id)
-                    if available > 0:
-                        # Create move from this warehouse to distribution
-                        qty_to_take = min(available, needed_qty)
-                        self._create_warehouse_transfer(line, warehouse, qty_to_take)
-                        needed_qty -= qty_to_take
-                        if needed_qty <= 0:
-                            break
-
-        return res
-
-    def _get_available_qty(self, warehouse, product):
-        """Get available quantity of product in specified warehouse"""
-        # Get the stock location of this warehouse
-        location = warehouse.lot_stock_id
-        quants = self.env['stock.quant'].search([
-            ('product_id', '=', product.id),
-            ('location_id', 'child_of', location.id),
-            ('location_id.usage', '=', 'internal'),
-        ])
-
-        # Sum the available quantities
-        available_qty = sum(quant.available_quantity for quant in quants)
-        return available_qty
-
-    def _create_warehouse_transfer(self, line, warehouse, qty):
-        """Create inter-warehouse transfer from source warehouse to distribution center"""
-        if not self.distribution_warehouse_id or not qty:
+    def _get_multi_warehouse_sourcing_method(self):
+        """Sourcing method configured for the website of multi-warehouse website orders"""
+        if self.website_id and self.is_website_multi_warehouse:
+            return self.website_id._get_multi_warehouse_config()['sourcing_method']
+        return super()._get_multi_warehouse_sourcing_method()
+
+    def _get_warehouse_distances(self, warehouses):
+        """Distance from each warehouse to the delivery address, for distance-based sourcing
+
+        :return: dict {warehouse_id: distance}, warehouses with unknown distance are omitted
+        """
+        self.ensure_one()
+        partner = self.partner_shipping_id
+        if not (partner.partner_latitude or partner.partner_longitude):
+            return {}
+        return warehouses._get_distances_to(partner.partner_latitude, partner.partner_longitude)
+
+    def _ensure_procurement_groups(self):
+        """Create the missing procurement groups of these orders in one batch"""
+        orders = self.filtered(lambda o: not o.procurement_group_id)
+        if not orders:
             return
+        groups = self.env["procurement.group"].create([{
+            'name': order.name,
+            'move_type': order.picking_policy,
+            'sale_id': order.id,
+            'partner_id': order.partner_id.id,
+        } for order in orders])
+        for order, group in zip(orders, groups):
+            order.procurement_group_id = group
+
+    @api.model
+    def _create_warehouse_transfers(self, transfers):
+        """Create inter-warehouse transfers from source warehouses to distribution centers
+
+        All lines of an order sourced from the same warehouse share one outgoing
+        (source -> transit) and one incoming (transit -> distribution center)
+        picking. Pickings and moves of all orders are created and confirmed in bulk.
+
+        :param transfers: dict {(order, source warehouse): [(sale.order.line, qty)]}
+        :return: dict {(order, source warehouse): (out_picking, in_picking)}
+        """
+        Warehouse = self.env['stock.warehouse']
+        transfers = {
+            (order, warehouse): [(line, qty) for line, qty in line_qtys if qty]
+            for (order, warehouse), line_qtys in transfers.items()
+            if order.distribution_warehouse_id
+        }
+        transfers = {key: line_qtys for key, line_qtys in transfers.items() if line_qtys}
+        if not transfers:
+            return {}
+
+        # Get or create procurement groups
+        self.env['sale.order'].union(*(order for order, _warehouse in transfers))._ensure_procurement_groups()
+
+        picking_vals_list = []
+        routes = []
+        for (order, warehouse), line_qtys in transfers.items():
+            # Get internal transfer types and locations (cached per warehouse)
+            topology = Warehouse._get_sourcing_route_topology(warehouse.id, order.distribution_warehouse_id.id)
+            if not topology['source']['int_type_id'] or not topology['dest']['int_type_id']:
+                continue
+            # Ensure we have valid locations
+            if not topology['source']['lot_stock_id'] or not topology['dest']['lot_stock_id']:
+                continue
 
-        # Get or create procurement group
-        if not self.procurement_group_id:
-            vals = {
-                'name': self.name,
-                'move_type': self.picking_policy,
-                'sale_id': self.id,
-                'partner_id': self.partner_id.id,
+            common_vals = {
+                'partner_id': order.partner_id.id,
+                'sale_id': order.id,
+                'group_id': order.procurement_group_id.id,
             }
-            self.procurement_group_id = self.env["procurement.group"].create(vals)
-
-        procurement_group = self.procurement_group_id
-
-        # Get internal transfer types
-        source_internal_type = self.env['stock.picking.type'].search([
-            ('code', '=', 'internal'),
-            ('warehouse_id', '=', warehouse.id),
-        ], limit=1)
-
-        dest_internal_type = self.env['stock.picking.type'].search([
-            ('code', '=', 'internal'),
-            ('warehouse_id', '=', self.distribution_warehouse_id.id),
-        ], limit=1)
-
-        if not source_internal_type or not dest_internal_type:
-            return
-
-        # Ensure we have valid locations
-        source_location = warehouse.lot_stock_id
-        dest_location = self.distribution_warehouse_id.lot_stock_id
-
-        if not source_location or not dest_location:
-            return
-
-        # Use guaranteed internal location as transit
-        transit_location = self.env.ref('stock.stock_location_inter_wh', raise_if_not_found=False)
-        if not transit_location:
-            transit_location = self.env['stock.location'].search([('usage', '=', 'transit')], limit=1)
-        if not transit_location:
-            transit_location = self.env['stock.location'].create({
-                'name': 'Inter-Warehouse Transit',
-                'usage': 'transit',
-            })
-
-        # Create outgoing transfer
-        out_picking = self.env['stock.picking'].create({
-            'picking_type_id': source_internal_type.id,
-            'location_id': source_location.id,
-            'location_dest_id': transit_location.id,
-            'origin': f"{self.name} (To DC)",
-            'partner_id': self.partner_id.id,
-            'sale_id': self.id,
-            'group_id': procurement_group.id,
-        })
-
-        # Create incoming transfer
-        in_picking = self.env['stock.picking'].create({
-            'picking_type_id': dest_internal_type.id,
-            'location_id': transit_location.id,
-            'location_dest_id': dest_location.id,
-            'origin': f"{self.name} (From {warehouse.name})",
-            'partner_id': self.partner_id.id,
-            'sale_id': self.id,
-            'group_id': procurement_group.id,
-        })
-
-        # Create moves
-        out_move = self.env['stock.move'].create({
-            'name': line.product_id.name,
-            'product_id': line.product_id.id,
-            'product_uom_qty': qty,
-            'product_uom': line.product_uom.id,
-            'picking_id': out_picking.id,
-            'location_id': source_location.id,
-            'location_dest_id': transit_location.id,
-            'sale_line_id': line.id,
-            'group_id': procurement_group.id,
-        })
-
-        in_move = self.env['stock.move'].create({
-            'name': line.product_id.name,
-            'product_id': line.product_id.id,
-            'product_uom_qty': qty,
-            'product_uom': line.product_uom.id,
-            'picking_id': in_picking.id,
-            'location_id': transit_location.id,
-            'location_dest_id': dest_location.id,
-            'sale_line_id': line.id,
-            'group_id': procurement_group.id,
-        })
-
-        # Link the moves
-        out_move.move_dest_ids = [(4, in_move.id)]
-        in_move.move_orig_ids = [(4, out_move.id)]
+            # Outgoing transfer
+            picking_vals_list.append(dict(
+                common_vals,
+                picking_type_id=topology['source']['int_type_id'],
+                location_id=topology['source']['lot_stock_id'],
+                location_dest_id=topology['transit_location_id'],
+                origin=f"{order.name} (To DC)",
+            ))
+            # Incoming transfer
+            picking_vals_list.append(dict(
+                common_vals,
+                picking_type_id=topology['dest']['int_type_id'],
+                location_id=topology['transit_location_id'],
+                location_dest_id=topology['dest']['lot_stock_id'],
+                origin=f"{order.name} (From {warehouse.name})",
+            ))
+            routes.append(((order, warehouse), topology, line_qtys))
+
+        if not picking_vals_list:
+            return {}
+        Stat = self.env['multi.warehouse.sourcing.stat']
+        with Stat._measure('transfer_create') as measure:
+            pickings = self._create_transfer_pickings_and_moves(picking_vals_list, routes)
+            measure['rows'] = len(pickings)
 
         # Confirm pickings
-        out_picking.action_confirm()
-        in_picking.action_confirm()
-
-        return out_picking, in_picking
+        with Stat._measure('transfer_confirm') as measure:
+            pickings.action_confirm()
+            measure['rows'] = len(pickings)
+
+        return {
+            key: (pickings[2 * index], pickings[2 * index + 1])
+            for index, (key, _topology, _line_qtys) in enumerate(routes)
+        }
+
+    @api.model
+    def _create_transfer_pickings_and_moves(self, picking_vals_list, routes):
+        """Create the outgoing/incoming picking pairs and their chained moves
+
+        :param picking_vals_list: values of the pickings, out and in picking of each route in turn
+        :param routes: list of ((order, warehouse), topology, [(line, qty)]) in the same order
+        :return: the created pickings
+        """
+        pickings = self.env['stock.picking'].create(picking_vals_list)
+
+        out_move_vals_list = []
+        in_move_vals_list = []
+        for index, (_key, topology, line_qtys) in enumerate(routes):
+            out_picking, in_picking = pickings[2 * index], pickings[2 * index + 1]
+            for line, qty in line_qtys:
+                move_vals = {
+                    'name': line.product_id.name,
+                    'product_id': line.product_id.id,
+                    'product_uom_qty': qty,
+                    'product_uom': line.product_uom.id,
+                    'sale_line_id': line.id,
+                    'group_id': out_picking.group_id.id,
+                }
+                out_move_vals_list.append(dict(
+                    move_vals,
+                    picking_id=out_picking.id,
+                    location_id=topology['source']['lot_stock_id'],
+                    location_dest_id=topology['transit_location_id'],
+                    # the outgoing move is the one sourcing the line, cancelling it cancels the incoming move
+                    is_multi_warehouse_source_move=True,
+                    propagate_cancel=True,
+                ))
+                in_move_vals_list.append(dict(
+                    move_vals,
+                    picking_id=in_picking.id,
+                    location_id=topology['transit_location_id'],
+                    location_dest_id=topology['dest']['lot_stock_id'],
+                ))
+
+        # Create moves, chaining each incoming move to its outgoing move at creation
+        out_moves = self.env['stock.move'].create(out_move_vals_list)
+        for in_move_vals, out_move in zip(in_move_vals_list, out_moves):
+            in_move_vals['move_orig_ids'] = [(4, out_move.id)]
+        self.env['stock.move'].create(in_move_vals_list)
+        return pickings
 
 class SaleOrderLine(models.Model):
     _inherit = 'sale.order.line'
 
+    def _get_multi_warehouse_sourcing_config(self):
+        """Consolidate website multi-warehouse orders at their distribution center
+
+        Lines already configured by another module (e.g. with their own source
+        warehouses) keep their settings; the distribution center is used to
+        collect them when they have no collection warehouse.
+        """
+        config = super()._get_multi_warehouse_sourcing_config()
+        order = self.order_id
+        if not (order.is_website_multi_warehouse and order.distribution_warehouse_id):
+            return config
+        if config:
+            if not config.get('destination_warehouse_id') and config['mode'] != 'direct':
+                config = dict(config, destination_warehouse_id=order.distribution_warehouse_id.id)
+            return config
+        return {
+            'mode': 'transit',
+            # Use the computed field, not the compute method
+            'warehouse_ids': order.sourcing_warehouse_ids.ids,
+            'destination_warehouse_id': order.distribution_warehouse_id.id,
+            'standard_rule': True,
+        }
+
     def _prepare_procurement_values(self, group_id=False):
         """Override to use the distribution warehouse for website orders"""
         values = super(SaleOrderLine, self)._prepare_procurement_values(group_id)
@@ -249,13 +278,15 @@ class SaleOrderLine(models.Model):
             values['warehouse_id'] = warehouse
 
             # Update route_ids if needed
-            if warehouse.delivery_route_id:
+            delivery_route = self.env['stock.route'].browse(
+                self.env['stock.warehouse']._get_sourcing_topology(warehouse.id)['delivery_route_id'])
+            if delivery_route:
                 # Important: Use a proper recordset with a specific field, not direct assignment
                 if 'route_ids' in values:
                     # Append to existing routes
-                    values['route_ids'] += warehouse.delivery_route_id
+                    values['route_ids'] += delivery_route
                 else:
                     # Create new routes field
-                    values['route_ids'] = warehouse.delivery_route_id
+                    values['route_ids'] = delivery_route
 
         return values
\ No newline at end of file
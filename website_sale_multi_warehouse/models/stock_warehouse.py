@@ -1,5 +1,12 @@
 # models/stock_warehouse.py
-from odoo import models, fields, api
+import threading
+
+from odoo import models, fields, api, tools
+from odoo.addons.multi_warehouse_sourcing_base.tools import DistanceIndex
+
+# In-memory distance index per database, kept in sync with the cached coordinates
+_distance_indexes = {}
+_distance_indexes_lock = threading.Lock()
 
 
 class StockWarehouse(models.Model):
@@ -30,6 +37,101 @@ class StockWarehouse(models.Model):
         help="Default route to use for deliveries from this distribution center"
     )
 
+    latitude = fields.Float(
+        string="Latitude",
+        digits=(10, 7),
+        compute="_compute_coordinates",
+        store=True,
+        readonly=False,
+        help="Used to rank warehouses by distance to the customer. Defaults to the address coordinates."
+    )
+
+    longitude = fields.Float(
+        string="Longitude",
+        digits=(10, 7),
+        compute="_compute_coordinates",
+        store=True,
+        readonly=False,
+        help="Used to rank warehouses by distance to the customer. Defaults to the address coordinates."
+    )
+
+    @api.depends('partner_id.partner_latitude', 'partner_id.partner_longitude')
+    def _compute_coordinates(self):
+        for warehouse in self:
+            warehouse.latitude = warehouse.partner_id.partner_latitude
+            warehouse.longitude = warehouse.partner_id.partner_longitude
+
+    @api.model
+    def _get_sourcing_topology_fields(self):
+        return super()._get_sourcing_topology_fields() | {
+            'is_ecommerce_source', 'ecommerce_priority', 'delivery_route_id', 'partner_id',
+        }
+
+    @api.model
+    @tools.ormcache('self._get_sourcing_topology_version()')
+    def _get_warehouse_coordinates(self):
+        """Coordinates of the located warehouses, cached until the sourcing topology changes
+
+        :return: tuple of (warehouse_id, latitude, longitude)
+        """
+        warehouses = self.sudo().search([
+            '|', ('latitude', '!=', 0.0), ('longitude', '!=', 0.0),
+        ])
+        return tuple((warehouse.id, warehouse.latitude, warehouse.longitude) for warehouse in warehouses)
+
+    @api.model
+    def _get_distance_index(self, coordinates):
+        """In-memory distance index of the warehouses
+
+        The index is built once per process and database and brought up to date
+        incrementally (only added, moved or removed warehouses are touched)
+        when the cached coordinates change. The index is shared by all threads:
+        it must only be used with _distance_indexes_lock held.
+
+        :param coordinates: result of _get_warehouse_coordinates
+        """
+        index = _distance_indexes.setdefault(self.env.cr.dbname, DistanceIndex())
+        if index.snapshot is not coordinates:
+            index.sync(coordinates, snapshot=coordinates)
+        return index
+
+    def _get_distances_to(self, latitude, longitude):
+        """Distance in km from each warehouse of self to a location
+
+        :return: dict {warehouse_id: distance}, warehouses without coordinates are omitted
+        """
+        # read outside of the lock, it may query the database
+        coordinates = self._get_warehouse_coordinates()
+        with _distance_indexes_lock:
+            return self._get_distance_index(coordinates).distances(latitude, longitude, self.ids)
+
+    @api.model
+    @tools.ormcache('company_id', 'self._get_sourcing_topology_version()')
+    def _get_ecommerce_source_warehouse_ids(self, company_id):
+        """Ids of the company's eCommerce source warehouses, by priority (lowest first)
+
+        Cached per company and topology version, which changes on writes of
+        is_ecommerce_source or ecommerce_priority.
+        """
+        return tuple(self.sudo().search([
+            ('is_ecommerce_source', '=', True),
+            ('company_id', '=', company_id),
+        ], order='ecommerce_priority asc').ids)
+
+    @api.model
+    @tools.ormcache('company_id', 'self._get_sourcing_topology_version()')
+    def _get_default_sourcing_warehouse_id(self, company_id):
+        """Id of the company's first warehouse, used when no eCommerce source exists"""
+        return self.sudo().search([('company_id', '=', company_id)], limit=1).id
+
+    def _sort_for_sourcing(self):
+        return self.sorted(lambda w: (w.ecommerce_priority, w.id))
+
+    def _prepare_sourcing_topology(self):
+        topology = super()._prepare_sourcing_topology()
+        topology['delivery_route_id'] = self.delivery_route_id.id
+        return topology
+
     @api.onchange('is_distribution_center')
     def _onchange_is_distribution_center(self):
         if self.is_distribution_center:
@@ -1,22 +1,37 @@
-from odoo import models, api
+from odoo import models, api, tools
 
 
 class Website(models.Model):
     _inherit = 'website'
 
+    @tools.ormcache('self.id', "self.env['stock.warehouse']._get_sourcing_topology_version()")
+    def _get_multi_warehouse_config(self):
+        """Multi-warehouse configuration of this website, kept in the registry cache
+
+        Cached per sourcing topology version, which changes when the settings
+        are saved with different values.
+
+        :return: frozendict with keys 'enabled', 'distribution_warehouse_id' and 'sourcing_method'
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        return tools.frozendict({
+            'enabled': bool(ICP.get_param('website_sale_multi_warehouse.enable_multi_warehouse_for_website')),
+            'distribution_warehouse_id': int(ICP.get_param(
+                'website_sale_multi_warehouse.default_distribution_warehouse_id', '0') or 0),
+            'sourcing_method': ICP.get_param('website_sale_multi_warehouse.sourcing_method', 'availability'),
+        })
+
     def _prepare_order_values(self, partner, pricelist):
         order_vals = super()._prepare_order_values(partner, pricelist)
 
         # Check if multi-warehouse is enabled
-        ICP = self.env['ir.config_parameter'].sudo()
-        if ICP.get_param('website_sale_multi_warehouse.enable_multi_warehouse_for_website'):
+        config = self._get_multi_warehouse_config()
+        if config['enabled']:
             # Set multi-warehouse flag
             order_vals['is_website_multi_warehouse'] = True
 
             # Set distribution center
-            distribution_warehouse_id = int(ICP.get_param(
-                'website_sale_multi_warehouse.default_distribution_warehouse_id', '0'))
-            if distribution_warehouse_id:
-                order_vals['distribution_warehouse_id'] = distribution_warehouse_id
+            if config['distribution_warehouse_id']:
+                order_vals['distribution_warehouse_id'] = config['distribution_warehouse_id']
 
         return order_vals
\ No newline at end of file
@@ -0,0 +1,2 @@
+# tests/__init__.py
+from . import test_benchmark
@@ -0,0 +1,44 @@
+# tests/test_benchmark.py
+from odoo.tests import tagged
+from odoo.addons.multi_warehouse_sourcing_base.tests.common import MultiWarehouseBenchmarkCommon
+
+
+@tagged('post_install', '-at_install', 'benchmark')
+class TestConsolidationBenchmark(MultiWarehouseBenchmarkCommon):
+    """Website checkout confirmation consolidating the order at a distribution center
+
+    Run with ``--test-tags benchmark``; the timings and query counts are logged.
+    """
+
+    # Query budget: (per confirmed order, per line added to every order), measured
+    # on the default data set plus budget_margin. None until a run was measured:
+    # the check is skipped and the skip message gives the budget to set here
+    consolidation_query_budget = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.website = cls.env['website'].create({
+            'name': 'Benchmark Website',
+            'company_id': cls.company.id,
+        })
+        cls.warehouses.write({'is_ecommerce_source': True})
+        cls.distribution_center.write({'is_distribution_center': True})
+        ICP = cls.env['ir.config_parameter'].sudo()
+        ICP.set_param('website_sale_multi_warehouse.enable_multi_warehouse_for_website', True)
+        ICP.set_param('website_sale_multi_warehouse.default_distribution_warehouse_id', cls.distribution_center.id)
+        ICP.set_param('website_sale_multi_warehouse.sourcing_method', 'availability')
+        # Website._get_multi_warehouse_config is cached in the registry
+        cls.env.registry.clear_cache()
+
+    def test_benchmark_consolidation(self):
+        def create_orders(n_orders, n_lines):
+            return self._create_orders(self.website, n_orders, n_lines, order_vals={
+                'is_website_multi_warehouse': True,
+                'distribution_warehouse_id': self.distribution_center.id,
+            })
+
+        report, _double_report = self._assert_query_budget(
+            'Consolidation at distribution center', create_orders,
+            self._get_query_budget('CONSOLIDATION', self.consolidation_query_budget))
+        self.assertTrue(report['created']['stock.picking'])